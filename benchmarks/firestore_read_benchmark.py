@@ -0,0 +1,157 @@
+"""
+Micro-benchmark for batched multi-document reads in database.firestore_operations.
+
+Compares read_many (batched get_all, one round trip per chunk) with calling
+read_data once per ID. Both run against a local stand-in for the Firestore
+client that charges a fixed round-trip time per RPC plus a small per-document
+cost, so the numbers show how the round trips add up rather than measuring
+a real network.
+
+Run from the repository root:
+
+    python -m benchmarks.firestore_read_benchmark --ids 10 50 200 --rtt-ms 20
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import database.firestore_operations as firestore_operations
+from database.firestore_operations import read_data, read_many
+from database.task_model import Task
+
+COLLECTION_NAME = "Task"
+
+
+class StandInSnapshot:
+    def __init__(self, document_id, data, fields=None):
+        self.id = document_id
+        self.exists = data is not None
+        if data is not None and fields is not None:
+            data = {field: data[field] for field in fields if field in data}
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class StandInDocument:
+    def __init__(self, client, collection_name, document_id):
+        self._client = client
+        self.collection_name = collection_name
+        self.id = document_id
+
+    def get(self, field_paths=None, **kwargs):
+        self._client.round_trip(1)
+        return self._client.snapshot(self, field_paths)
+
+
+class StandInCollection:
+    def __init__(self, client, name):
+        self._client = client
+        self.name = name
+
+    def document(self, document_id):
+        return StandInDocument(self._client, self.name, document_id)
+
+
+class StandInClient:
+    """Just enough of firestore.Client for read_data and read_many, with simulated latency."""
+
+    def __init__(self, documents, rtt_ms, per_document_us):
+        self.documents = documents
+        self.rtt = rtt_ms / 1000
+        self.per_document = per_document_us / 1e6
+        self.round_trips = 0
+
+    def round_trip(self, document_count):
+        self.round_trips += 1
+        time.sleep(self.rtt + self.per_document * document_count)
+
+    def snapshot(self, reference, field_paths):
+        return StandInSnapshot(reference.id, self.documents.get(reference.id), field_paths)
+
+    def collection(self, name):
+        return StandInCollection(self, name)
+
+    def get_all(self, references, field_paths=None, **kwargs):
+        references = list(references)
+        self.round_trip(len(references))
+        # The real client yields in arbitrary order
+        return [self.snapshot(reference, field_paths) for reference in reversed(references)]
+
+
+def build_documents(count):
+    now = datetime.now(timezone.utc)
+    return {
+        f"task{i:05d}": {
+            "message": f"benchmark task {i}",
+            "sourceId": "Ubenchmark",
+            "notifiedId": f"Gbenchmark{i % 10}",
+            "isNotified": False,
+            "expireDate": now + timedelta(days=1),
+            "notifyDate": now + timedelta(minutes=i),
+        }
+        for i in range(count)
+    }
+
+def measure(client, func):
+    client.round_trips = 0
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    return result, {"totalMs": round(elapsed * 1000, 1), "roundTrips": client.round_trips}
+
+def run(id_counts, rtt_ms, per_document_us, missing_every, fields):
+    documents = build_documents(max(id_counts))
+    client = StandInClient(documents, rtt_ms, per_document_us)
+    firestore_operations.get_db = lambda: client
+    # Warm up the code paths so the first case does not pay for it
+    read_many(COLLECTION_NAME, list(documents)[:1], fields, decode=Task.from_snapshot)
+
+    results = {}
+    for count in id_counts:
+        ids = list(documents)[:count]
+        # Every missing_every-th ID does not exist
+        if missing_every:
+            ids = [f"missing{i}" if i % missing_every == missing_every - 1 else task_id for i, task_id in enumerate(ids)]
+
+        looped, loop_stats = measure(client, lambda: [
+            read_data(COLLECTION_NAME, task_id, fields, decode=Task.from_snapshot) for task_id in ids
+        ])
+        batched, batch_stats = measure(client, lambda: read_many(COLLECTION_NAME, ids, fields, decode=Task.from_snapshot))
+        if looped != batched:
+            raise AssertionError(f"read_many returned different tasks than the per-ID loop for {count} IDs")
+
+        results[count] = {"loop": loop_stats, "read_many": batch_stats}
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ids", type=int, nargs="+", default=[10, 50, 200], help="Numbers of IDs to read")
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="Simulated round-trip time per RPC")
+    parser.add_argument("--per-doc-us", type=float, default=50.0, help="Simulated cost per returned document")
+    parser.add_argument("--missing-every", type=int, default=10, help="Make every n-th ID missing (0 = none)")
+    parser.add_argument("--fields", nargs="*", help="Project these fields, e.g. message notifyDate")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.ids, args.rtt_ms, args.per_doc_us, args.missing_every, args.fields)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"rtt={args.rtt_ms}ms per-doc={args.per_doc_us}us, every {args.missing_every}th ID missing")
+    print(f"{'ids':>6}{'loop ms':>12}{'trips':>8}{'read_many ms':>15}{'trips':>8}{'speedup':>10}")
+    for count, result in results.items():
+        loop, batched = result["loop"], result["read_many"]
+        speedup = loop["totalMs"] / batched["totalMs"] if batched["totalMs"] else float("inf")
+        print(f"{count:>6}{loop['totalMs']:>12.1f}{loop['roundTrips']:>8}"
+              f"{batched['totalMs']:>15.1f}{batched['roundTrips']:>8}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
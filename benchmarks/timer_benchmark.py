@@ -0,0 +1,90 @@
+"""
+Micro-benchmark for the datetime conversion and formatting in utils.timer.
+
+Times the work done for every rendered reminder: converting notify/expire
+dates to the chat's timezone and formatting them for display, plus the
+datetime picker's LINE timestamp formatting. Compares the per-minute cached
+helpers with converting and formatting on every call (zoneinfo, and pytz
+when it is installed).
+
+Run from the repository root:
+
+    python -m benchmarks.timer_benchmark --calls 200000 --minutes 30
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from utils.timer import (DISPLAY_DATETIME_FORMAT, LINE_DATETIME_FORMAT,
+                         format_local_minute, get_line_datetime_string_format)
+
+TIMEZONE_NAME = "Asia/Taipei"
+
+
+def build_workload(calls, minutes):
+    """
+    Datetimes as a notification burst sees them: `calls` reminders spread
+    over `minutes` distinct minutes, with arbitrary seconds.
+    """
+    base = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    rng = random.Random(0)
+    return [base + timedelta(minutes=rng.randrange(minutes), seconds=rng.randrange(60)) for _ in range(calls)]
+
+def measure(func, values):
+    started = time.perf_counter()
+    for value in values:
+        func(value)
+    elapsed = time.perf_counter() - started
+    return {"totalMs": round(elapsed * 1000, 1), "nsPerCall": round(elapsed / len(values) * 1e9)}
+
+def run(calls, minutes):
+    datetimes = build_workload(calls, minutes)
+    timestamps = [value.timestamp() * 1000 for value in datetimes]
+    zone = ZoneInfo(TIMEZONE_NAME)
+
+    cases = {
+        "display/zoneinfo": (lambda value: value.astimezone(zone).strftime(DISPLAY_DATETIME_FORMAT), datetimes),
+        "display/cached": (lambda value: format_local_minute(value, zone), datetimes),
+        "line_timestamp/zoneinfo": (
+            lambda value: datetime.fromtimestamp(value / 1000, zone).strftime(LINE_DATETIME_FORMAT), timestamps),
+        "line_timestamp/cached": (lambda value: get_line_datetime_string_format(value, zone), timestamps),
+    }
+
+    try:
+        import pytz
+    except ImportError:
+        pytz = None
+    if pytz is not None:
+        pytz_zone = pytz.timezone(TIMEZONE_NAME)
+        cases["display/pytz"] = (lambda value: value.astimezone(pytz_zone).strftime(DISPLAY_DATETIME_FORMAT), datetimes)
+        cases["line_timestamp/pytz"] = (
+            lambda value: datetime.fromtimestamp(value / 1000, pytz_zone).strftime(LINE_DATETIME_FORMAT), timestamps)
+
+    return {name: measure(func, values) for name, (func, values) in sorted(cases.items())}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=200000, help="Conversions per case")
+    parser.add_argument("--minutes", type=int, default=30, help="Distinct minutes the reminders fall on")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.calls, args.minutes)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.calls} calls over {args.minutes} distinct minutes")
+    print(f"{'case':<28}{'total ms':>12}{'ns/call':>10}")
+    for name, result in results.items():
+        print(f"{name:<28}{result['totalMs']:>12.1f}{result['nsPerCall']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Load test and latency benchmark for the webhook and notification paths.
+
+Drives the Flask app in-process with signed synthetic LINE webhook payloads,
+using the in-memory (or SQLite) task storage in place of Firestore and a
+local HTTP server in place of the LINE Messaging API, then reports
+p50/p95/p99 latency, throughput and a per-stage breakdown.
+
+Run from the repository root:
+
+    python -m benchmarks.webhook_benchmark --scenario all --requests 500 --concurrency 8
+    python -m benchmarks.webhook_benchmark --scenario mention --rate 200 --line-latency-ms 30
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHANNEL_SECRET = "benchmark-channel-secret"
+SCENARIOS = ("mention", "expire_postback", "draft_postback", "notify_postback", "notify_check")
+
+
+class StageTimer:
+    """Thread-safe accumulator of per-stage call counts and durations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.enabled = True
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return wrapper
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+
+class FakeLineApi:
+    """Local stand-in for the LINE Messaging API reply and push endpoints."""
+
+    def __init__(self, latency_ms=0.0):
+        latency = latency_ms / 1000
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if latency:
+                    time.sleep(latency)
+                body = json.dumps({"sentMessages": [{"id": uuid.uuid4().hex, "quoteToken": "q"}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def sign(body):
+    digest = hmac.new(CHANNEL_SECRET.encode(), body.encode(), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+def event_envelope(event_type, extra):
+    return {
+        "type": event_type,
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "webhookEventId": uuid.uuid4().hex,
+        "deliveryContext": {"isRedelivery": False},
+        "source": {"type": "group", "groupId": "Gbenchmark", "userId": "Ubenchmark"},
+        "replyToken": uuid.uuid4().hex,
+        **extra,
+    }
+
+def webhook_body(event):
+    return json.dumps({"destination": "Ubot", "events": [event]}, ensure_ascii=False)
+
+def mention_event():
+    text = "@YangBot 提醒 買牛奶"
+    return event_envelope("message", {"message": {
+        "id": uuid.uuid4().hex,
+        "type": "text",
+        "quoteToken": "q",
+        "text": text,
+        "mention": {"mentionees": [{"index": 0, "length": 7, "type": "user", "userId": "Ubot", "isSelf": True}]},
+    }})
+
+def postback_event(task_id, action, local_datetime, key="taskId"):
+    return event_envelope("postback", {"postback": {
+        "data": f"{key}={task_id}&action={action}",
+        "params": {"datetime": local_datetime.strftime('%Y-%m-%dT%H:%M')},
+    }})
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50) * 1000,
+        "p95": percentile(values, 0.95) * 1000,
+        "p99": percentile(values, 0.99) * 1000,
+        "total": sum(values) * 1000,
+    }
+
+
+def load_app(storage_backend, webhook_async, line_api_url):
+    os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "benchmark-access-token")
+    os.environ["LINE_CHANNEL_SECRET"] = CHANNEL_SECRET
+    os.environ["LINE_API_HOST"] = line_api_url
+    os.environ["STORAGE_BACKEND"] = storage_backend
+    os.environ["SQLITE_PATH"] = ":memory:"
+    os.environ["WEBHOOK_ASYNC"] = "true" if webhook_async else "false"
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    os.environ["CHAT_TIMEZONE_BACKEND"] = "memory"
+    os.environ.setdefault("LINE_API_POOL_SIZE", "64")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import main
+    return main
+
+def instrument(stage_timer):
+    """Wrap the storage backend, flex rendering and LINE API calls with stage timers."""
+    from linebot.v3.messaging import MessagingApi
+
+    from database.task_storage import get_task_storage
+    from handlers.flex_templates import FlexTemplate
+
+    storage = get_task_storage()
+    for name in ("create", "get", "update", "update_many", "delete", "query", "query_notify_range", "claim"):
+        setattr(storage, name, stage_timer.wrap(f"storage.{name}", getattr(storage, name)))
+    FlexTemplate.render = stage_timer.wrap("flex.render", FlexTemplate.render)
+    MessagingApi.reply_message_with_http_info = stage_timer.wrap("line.reply", MessagingApi.reply_message_with_http_info)
+    MessagingApi.push_message_with_http_info = stage_timer.wrap("line.push", MessagingApi.push_message_with_http_info)
+
+
+def prepare_tasks(count, local_now):
+    """Create tasks that postback scenarios can act on, bypassing the webhook."""
+    from database.task_operations import create_task, update_task
+    from utils.timer import to_utc_datetime
+
+    expire_date = to_utc_datetime((local_now + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M'))
+    task_ids = []
+    for i in range(count):
+        task_id = create_task(f"benchmark task {i}", "Ubenchmark", "Gbenchmark", False, None)
+        update_task(task_id, {"expireDate": expire_date, "notifyDate": expire_date})
+        task_ids.append(task_id)
+    return task_ids
+
+def prepare_drafts(count):
+    """Mint signed reminder drafts, as the "提醒" command puts them in the date picker's postback data."""
+    from handlers.reminder_drafts import encode_reminder_draft
+
+    return [encode_reminder_draft(f"benchmark draft {i}", "Ubenchmark", "Gbenchmark") for i in range(count)]
+
+def prepare_due_tasks(count):
+    from database.task_operations import create_task, update_task
+
+    now = datetime.now(timezone.utc)
+    for i in range(count):
+        task_id = create_task(f"due task {i}", "Ubenchmark", f"Gbenchmark{i % 10}", False, None)
+        update_task(task_id, {"expireDate": now + timedelta(hours=1), "notifyDate": now - timedelta(seconds=30)})
+
+def build_requests(scenario, count):
+    """Return a list of (method, body) pairs, one per request."""
+    from utils.timer import default_timezone
+
+    local_now = datetime.now(default_timezone).replace(tzinfo=None)
+
+    if scenario == "mention":
+        return [("POST", webhook_body(mention_event())) for _ in range(count)]
+
+    if scenario == "expire_postback":
+        task_ids = prepare_tasks(count, local_now)
+        picked = local_now + timedelta(hours=2)
+        return [("POST", webhook_body(postback_event(task_id, "expireDate", picked))) for task_id in task_ids]
+
+    if scenario == "draft_postback":
+        # The draft= path: verify the token and create the task in a single write
+        tokens = prepare_drafts(count)
+        picked = local_now + timedelta(hours=2)
+        return [("POST", webhook_body(postback_event(token, "expireDate", picked, key="draft"))) for token in tokens]
+
+    if scenario == "notify_postback":
+        task_ids = prepare_tasks(count, local_now)
+        picked = local_now + timedelta(hours=1)
+        return [("POST", webhook_body(postback_event(task_id, "notifyDate", picked))) for task_id in task_ids]
+
+    if scenario == "notify_check":
+        return [("GET", None) for _ in range(count)]
+
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+def run_scenario(main, stage_timer, scenario, count, concurrency, rate, due_tasks_per_check):
+    client = main.app.test_client()
+    requests = build_requests(scenario, count)
+    stage_timer.reset()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    interval = 1.0 / rate if rate else 0.0
+    started = time.perf_counter()
+
+    def issue(index):
+        nonlocal errors
+        if interval:
+            # Open-loop pacing: request i is released at started + i * interval
+            delay = started + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        method, body = requests[index]
+        if scenario == "notify_check":
+            # Runs on a single worker, so pausing the stage timer only hides the setup writes
+            stage_timer.enabled = False
+            prepare_due_tasks(due_tasks_per_check)
+            stage_timer.enabled = True
+
+        request_started = time.perf_counter()
+        if method == "POST":
+            response = client.post("/callback", data=body.encode(), headers={
+                "X-Line-Signature": sign(body),
+                "Content-Type": "application/json",
+            })
+        else:
+            response = client.get("/notify_check")
+        elapsed = time.perf_counter() - request_started
+
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code != 200:
+                errors += 1
+
+    # /notify_check is driven by a cron tick, so overlapping runs are not a realistic load
+    workers = 1 if scenario == "notify_check" else concurrency
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(issue, range(len(requests))))
+
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "wallSeconds": wall,
+        "throughput": len(requests) / wall if wall else 0.0,
+        "latency": summarize(latencies),
+    }
+
+def print_report(scenario, result, stages):
+    latency = result["latency"]
+    print(f"\n== {scenario} ==")
+    print(f"requests={result['requests']} errors={result['errors']} "
+          f"wall={result['wallSeconds']:.2f}s throughput={result['throughput']:.1f} req/s")
+    print(f"latency ms: p50={latency['p50']:.2f} p95={latency['p95']:.2f} p99={latency['p99']:.2f}")
+    if stages:
+        print(f"{'stage':<28}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total ms':>12}")
+        for stage, summary in sorted(stages.items()):
+            print(f"{stage:<28}{summary['count']:>8}{summary['p50']:>10.2f}{summary['p95']:>10.2f}"
+                  f"{summary['p99']:>10.2f}{summary['total']:>12.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--rate", type=float, default=0.0, help="Target requests per second (0 = as fast as possible)")
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--line-latency-ms", type=float, default=0.0, help="Simulated LINE API latency")
+    parser.add_argument("--due-tasks", type=int, default=20, help="Due tasks created before each /notify_check")
+    parser.add_argument("--async-webhook", action="store_true", help="Benchmark with WEBHOOK_ASYNC enabled")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    line_api = FakeLineApi(latency_ms=args.line_latency_ms)
+    app_module = load_app(args.storage, args.async_webhook, line_api.url)
+    stage_timer = StageTimer()
+    instrument(stage_timer)
+
+    results = {}
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    for scenario in scenarios:
+        result = run_scenario(app_module, stage_timer, scenario, args.requests, args.concurrency, args.rate, args.due_tasks)
+        stages = {stage: summarize(samples) for stage, samples in stage_timer.samples.items()}
+        results[scenario] = {**result, "stages": stages}
+        if not args.json:
+            print_report(scenario, result, stages)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    line_api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import logging
+
+from .firestore_operations import read_data, write_data
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "ChatSetting"
+
+def get_chat_timezone_name(chat_id):
+    """
+    Read the timezone a chat has chosen.
+
+    :param chat_id: Group, room or user ID
+    :return: IANA timezone name, or None if the chat has not set one
+    """
+    data = read_data(COLLECTION_NAME, chat_id, fields=["timezone"])
+    return data.get("timezone") if data else None
+
+def set_chat_timezone_name(chat_id, name):
+    """
+    Store the timezone a chat has chosen.
+
+    :param chat_id: Group, room or user ID
+    :param name: IANA timezone name
+    :return: True if successful, False otherwise
+    """
+    return write_data(COLLECTION_NAME, chat_id, {"timezone": name}) is not None
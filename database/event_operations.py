@@ -0,0 +1,50 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from utils.metrics import timed
+
+from .firestore_init import get_db
+from .firestore_operations import FIRESTORE_OPERATION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "WebhookEvent"
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="claim_event")
+def claim_event(event_id, ttl_seconds):
+    """
+    Record a webhook event ID, failing if another instance already recorded it.
+
+    Documents carry an `expireAt` field so a Firestore TTL policy can remove them.
+
+    :param event_id: LINE webhookEventId
+    :param ttl_seconds: How long the event ID should be remembered
+    :return: True if this call claimed the event, False if it was already seen
+    """
+    from google.api_core.exceptions import AlreadyExists
+
+    now = datetime.now(timezone.utc)
+    try:
+        get_db().collection(COLLECTION_NAME).document(event_id).create({
+            "receivedAt": now,
+            "expireAt": now + timedelta(seconds=ttl_seconds),
+        })
+        return True
+    except AlreadyExists:
+        return False
+    except Exception as e:
+        # Fail open: a missed duplicate is better than a dropped event
+        logger.error("Error claiming webhook event %s: %s", event_id, e)
+        return True
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="release_event")
+def release_event(event_id):
+    """
+    Forget a claimed webhook event ID, so a redelivery of the event is processed again.
+
+    :param event_id: LINE webhookEventId
+    """
+    try:
+        get_db().collection(COLLECTION_NAME).document(event_id).delete()
+    except Exception as e:
+        logger.error("Error releasing webhook event %s: %s", event_id, e)
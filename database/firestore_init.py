@@ -1,14 +1,37 @@
-from google.cloud import firestore
+import threading
 
 database = "yang-line-bot-database"
 
+_db = None
+_lock = threading.Lock()
+
 def initialize_firestore():
     """
     Initialize Firestore client using google-cloud-firestore.
     """
+    # Imported here so that importing the database package stays cheap on cold start
+    from google.cloud import firestore
+
     # Create Firestore client
     db = firestore.Client(database=database)
     return db
 
-# Initialize Firestore when this module is imported
-db = initialize_firestore()
+def get_db():
+    """
+    Return the process-wide Firestore client, creating it on first use.
+    """
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                _db = initialize_firestore()
+    return _db
+
+def reset_db():
+    """
+    Drop the current Firestore client so the next get_db() creates a new one,
+    e.g. in a child process after fork, where the parent's gRPC channel must not be reused.
+    """
+    global _db
+    with _lock:
+        _db = None
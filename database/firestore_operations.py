@@ -1,6 +1,26 @@
-from .firestore_init import db
+import logging
 
+from utils.metrics import Histogram, timed
 
+from .firestore_init import get_db
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batched writes with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+DEFAULT_PAGE_SIZE = 200
+
+# Documents requested per batched get; keeps each BatchGetDocuments response bounded
+READ_MANY_CHUNK_SIZE = 100
+
+FIRESTORE_OPERATION_SECONDS = Histogram(
+    "yangbot_firestore_operation_seconds",
+    "Time spent in Firestore operations",
+    ["operation"],
+)
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="write")
 def write_data(collection_name, document_id, data):
     """
     Write data to a Firestore document.
@@ -11,38 +31,98 @@ def write_data(collection_name, document_id, data):
     """
     try:
         if document_id:
-            doc_ref = db.collection(collection_name).document(document_id)
+            doc_ref = get_db().collection(collection_name).document(document_id)
             doc_ref.set(data)
             return document_id
         else:
-            doc_ref = db.collection(collection_name).add(data)
+            doc_ref = get_db().collection(collection_name).add(data)
             generated_id = doc_ref[1].id
-            print(f"Data written to {collection_name}/{generated_id}")
+            logger.debug("Data written to %s/%s", collection_name, generated_id)
             return generated_id
     except Exception as e:
-        print(f"Error writing data: {e}")
+        logger.error("Error writing data: %s", e)
         return None
 
-def read_data(collection_name, document_id):
+@timed(FIRESTORE_OPERATION_SECONDS, operation="create")
+def create_data(collection_name, document_id, data):
+    """
+    Create a Firestore document, failing if one with this ID already exists.
+
+    :param collection_name: Name of the collection
+    :param document_id: ID of the document
+    :param data: Dictionary of data to write
+    :return: Document ID, or None if the document exists or the write failed
+    """
+    from google.api_core.exceptions import AlreadyExists
+
+    try:
+        get_db().collection(collection_name).document(document_id).create(data)
+        return document_id
+    except AlreadyExists:
+        logger.debug("Document %s/%s already exists", collection_name, document_id)
+        return None
+    except Exception as e:
+        logger.error("Error creating document: %s", e)
+        return None
+
+def document_to_dict(doc):
+    """Default decoder: the document fields plus its ID under 'id'."""
+    return {**doc.to_dict(), 'id': doc.id}
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="read")
+def read_data(collection_name, document_id, fields=None, decode=document_to_dict):
     """
     Read data from a Firestore document.
 
     :param collection_name: Name of the collection
     :param document_id: ID of the document
-    :return: Document data as a dictionary, or None if not found
+    :param fields: Only fetch these fields, or None for all
+    :param decode: Converts the DocumentSnapshot into the returned value
+    :return: Decoded document, or None if not found
     """
     try:
-        doc_ref = db.collection(collection_name).document(document_id)
-        doc = doc_ref.get()
+        doc_ref = get_db().collection(collection_name).document(document_id)
+        doc = doc_ref.get(field_paths=fields)
         if doc.exists:
-            return {**doc.to_dict(), 'id': doc.id}
+            return decode(doc)
         else:
-            print(f"Document {collection_name}/{document_id} not found")
+            logger.debug("Document %s/%s not found", collection_name, document_id)
             return None
     except Exception as e:
-        print(f"Error reading data: {e}")
+        logger.error("Error reading data: %s", e)
         return None
 
+@timed(FIRESTORE_OPERATION_SECONDS, operation="read_many")
+def read_many(collection_name, document_ids, fields=None, decode=document_to_dict, chunk_size=READ_MANY_CHUNK_SIZE):
+    """
+    Read many Firestore documents with batched gets, one round trip per chunk.
+
+    :param collection_name: Name of the collection
+    :param document_ids: IDs of the documents; duplicates are fetched once
+    :param fields: Only fetch these fields, or None for all
+    :param decode: Converts each DocumentSnapshot into the returned value
+    :param chunk_size: Documents per batched get
+    :return: List of decoded documents in the order of `document_ids`, None for missing or unreadable ones
+    """
+    document_ids = list(document_ids)
+    unique_ids = list(dict.fromkeys(document_ids))
+    found = {}
+    db = get_db()
+    collection = db.collection(collection_name)
+
+    for offset in range(0, len(unique_ids), chunk_size):
+        chunk = unique_ids[offset:offset + chunk_size]
+        try:
+            # get_all returns snapshots in arbitrary order, including non-existent ones
+            for doc in db.get_all([collection.document(document_id) for document_id in chunk], field_paths=fields):
+                if doc.exists:
+                    found[doc.id] = decode(doc)
+        except Exception as e:
+            logger.error("Error reading %d documents from %s: %s", len(chunk), collection_name, e)
+
+    return [found.get(document_id) for document_id in document_ids]
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="update")
 def update_data(collection_name, document_id, data):
     """
     Update data in a Firestore document.
@@ -50,29 +130,138 @@ def update_data(collection_name, document_id, data):
     :param collection_name: Name of the collection
     :param document_id: ID of the document
     :param data: Dictionary of data to update
+    :return: True if successful, False otherwise
     """
     try:
-        doc_ref = db.collection(collection_name).document(document_id)
+        doc_ref = get_db().collection(collection_name).document(document_id)
         doc_ref.update(data)
-        print(f"Data updated in {collection_name}/{document_id}")
+        logger.debug("Data updated in %s/%s", collection_name, document_id)
+        return True
     except Exception as e:
-        print(f"Error updating data: {e}")
+        logger.error("Error updating data: %s", e)
+        return False
+
+def commit_in_chunks(document_ids, add_writes, write_one, chunk_size=MAX_BATCH_SIZE):
+    """
+    Commit per-document writes in batches of `chunk_size` documents.
+
+    A batch commits atomically, so when a chunk fails its documents are
+    retried one by one to find out exactly which ones could not be written.
 
+    :param document_ids: IDs of the documents to write
+    :param add_writes: Callable(batch, document_id) adding a document's writes to a batch
+    :param write_one: Callable(document_id) performing the same writes without a batch
+    :param chunk_size: Maximum number of documents per batch
+    :return: Tuple of (list of written IDs, dictionary of failed ID -> error message)
+    """
+    db = get_db()
+    written, failed = [], {}
+
+    for start in range(0, len(document_ids), chunk_size):
+        chunk = document_ids[start:start + chunk_size]
+        try:
+            batch = db.batch()
+            for document_id in chunk:
+                add_writes(batch, document_id)
+            batch.commit()
+            written.extend(chunk)
+        except Exception as e:
+            logger.warning("Error committing batch, retrying individually: %s", e)
+            for document_id in chunk:
+                try:
+                    write_one(document_id)
+                    written.append(document_id)
+                except Exception as doc_error:
+                    failed[document_id] = str(doc_error)
+
+    return written, failed
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="update_many")
+def update_many(collection_name, document_ids, data, chunk_size=MAX_BATCH_SIZE):
+    """
+    Apply the same update to many Firestore documents using batched writes.
+
+    :param collection_name: Name of the collection
+    :param document_ids: IDs of the documents to update
+    :param data: Dictionary of data to update in every document
+    :param chunk_size: Maximum number of writes per batch
+    :return: Dictionary with 'updated' (list of IDs) and 'failed' (ID -> error message)
+    """
+    collection = get_db().collection(collection_name)
+    updated, failed = commit_in_chunks(
+        document_ids,
+        lambda batch, document_id: batch.update(collection.document(document_id), data),
+        lambda document_id: collection.document(document_id).update(data),
+        min(chunk_size, MAX_BATCH_SIZE),
+    )
+    logger.debug("Batch updated %d documents in %s", len(updated), collection_name)
+    return {"updated": updated, "failed": failed}
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="delete_many")
+def delete_many(collection_name, document_ids, chunk_size=MAX_BATCH_SIZE):
+    """
+    Delete many Firestore documents using batched writes.
+
+    :param collection_name: Name of the collection
+    :param document_ids: IDs of the documents to delete
+    :param chunk_size: Maximum number of deletes per batch
+    :return: Dictionary with 'deleted' (list of IDs) and 'failed' (ID -> error message)
+    """
+    collection = get_db().collection(collection_name)
+    deleted, failed = commit_in_chunks(
+        document_ids,
+        lambda batch, document_id: batch.delete(collection.document(document_id)),
+        lambda document_id: collection.document(document_id).delete(),
+        min(chunk_size, MAX_BATCH_SIZE),
+    )
+    return {"deleted": deleted, "failed": failed}
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="move_many")
+def move_many(collection_name, target_collection_name, documents, chunk_size=MAX_BATCH_SIZE):
+    """
+    Move documents to another collection, copying and deleting each one in the same batch.
+
+    :param collection_name: Name of the source collection
+    :param target_collection_name: Name of the collection to copy into
+    :param documents: Dictionary of document ID -> data to write in the target collection
+    :param chunk_size: Maximum number of writes per batch; each document takes two
+    :return: Dictionary with 'moved' (list of IDs) and 'failed' (ID -> error message)
+    """
+    db = get_db()
+    source, target = db.collection(collection_name), db.collection(target_collection_name)
+
+    def add_writes(batch, document_id):
+        batch.set(target.document(document_id), documents[document_id])
+        batch.delete(source.document(document_id))
+
+    def write_one(document_id):
+        # Copy first: a failure in between leaves a duplicate, never a lost document
+        target.document(document_id).set(documents[document_id])
+        source.document(document_id).delete()
+
+    moved, failed = commit_in_chunks(list(documents), add_writes, write_one, min(chunk_size, MAX_BATCH_SIZE) // 2)
+    return {"moved": moved, "failed": failed}
+
+@timed(FIRESTORE_OPERATION_SECONDS, operation="delete")
 def delete_data(collection_name, document_id):
     """
     Delete a Firestore document.
 
     :param collection_name: Name of the collection
     :param document_id: ID of the document
+    :return: True if successful, False otherwise
     """
     try:
-        doc_ref = db.collection(collection_name).document(document_id)
+        doc_ref = get_db().collection(collection_name).document(document_id)
         doc_ref.delete()
-        print(f"Document {collection_name}/{document_id} deleted")
+        logger.debug("Document %s/%s deleted", collection_name, document_id)
+        return True
     except Exception as e:
-        print(f"Error deleting data: {e}")
+        logger.error("Error deleting data: %s", e)
+        return False
 
-def query_data(collection_name, field, operator, value):
+@timed(FIRESTORE_OPERATION_SECONDS, operation="query")
+def query_data(collection_name, field, operator, value, fields=None, decode=document_to_dict):
     """
     Query data from a Firestore collection.
 
@@ -80,15 +269,43 @@ def query_data(collection_name, field, operator, value):
     :param field: Field to query
     :param operator: Query operator (e.g., '==', '>', '<')
     :param value: Value to compare
-    :return: List of documents matching the query
+    :param fields: Only fetch these fields, or None for all
+    :param decode: Converts each DocumentSnapshot into a returned value
+    :return: List of decoded documents matching the query
     """
     try:
-        query = db.collection(collection_name).where(field, operator, value)
-        results = query.stream()
-        docs = []
-        for doc in results:
-            docs.append({**doc.to_dict(), 'id': doc.id})
-        return docs
+        query = get_db().collection(collection_name).where(field, operator, value)
+        if fields is not None:
+            query = query.select(fields)
+        return [decode(doc) for doc in query.stream()]
     except Exception as e:
-        print(f"Error querying data: {e}")
+        logger.error("Error querying data: %s", e)
         return []
+
+def iter_query_pages(query, page_size=DEFAULT_PAGE_SIZE, decode=document_to_dict):
+    """
+    Stream an ordered Firestore query one page at a time using cursors.
+
+    Only one page is held in memory at a time. The query must already have an
+    order_by; the last document of each page is the cursor for the next, so a
+    projection (select) must include the ordered fields.
+
+    :param query: Ordered Firestore query
+    :param page_size: Maximum number of documents per page
+    :param decode: Converts each DocumentSnapshot into a returned value
+    :return: Generator of lists of decoded documents
+    """
+    cursor = None
+    while True:
+        page_query = query.limit(page_size)
+        if cursor is not None:
+            page_query = page_query.start_after(cursor)
+        docs = list(page_query.stream())
+        if not docs:
+            return
+
+        yield [decode(doc) for doc in docs]
+
+        if len(docs) < page_size:
+            return
+        cursor = docs[-1]
@@ -0,0 +1,214 @@
+import logging
+from datetime import datetime, timezone
+
+from utils.metrics import timed
+
+from .firestore_init import get_db
+from .firestore_operations import (FIRESTORE_OPERATION_SECONDS, create_data,
+                                   delete_data, delete_many, iter_query_pages,
+                                   move_many,
+                                   query_data, read_data, read_many,
+                                   update_data, update_many, write_data)
+from .task_model import Task
+from .task_storage import TaskStorage, can_claim
+
+COLLECTION_NAME = "Task"
+ARCHIVE_COLLECTION_NAME = "TaskArchive"
+
+logger = logging.getLogger(__name__)
+
+
+class FirestoreTaskStorage(TaskStorage):
+    """Task storage backed by the Firestore 'Task' collection."""
+
+    def __init__(self):
+        # Optional TaskWatch serving due-task scans from memory (see start_task_watch)
+        self.watch = None
+
+    def _watch_discard(self, task_ids, updates=None):
+        if self.watch is not None and (updates is None or updates.get("isNotified")):
+            self.watch.discard(task_ids)
+
+    def create(self, data, task_id=None):
+        if task_id:
+            return create_data(COLLECTION_NAME, task_id, data)
+        return write_data(COLLECTION_NAME, None, data)
+
+    def get(self, task_id, fields=None):
+        return read_data(COLLECTION_NAME, task_id, fields, decode=Task.from_snapshot)
+
+    def get_many(self, task_ids, fields=None):
+        return read_many(COLLECTION_NAME, task_ids, fields, decode=Task.from_snapshot)
+
+    def update(self, task_id, updates):
+        updated = update_data(COLLECTION_NAME, task_id, updates)
+        if updated:
+            self._watch_discard([task_id], updates)
+        return updated
+
+    def update_many(self, task_ids, updates):
+        result = update_many(COLLECTION_NAME, list(task_ids), updates)
+        self._watch_discard(result["updated"], updates)
+        return result
+
+    def delete(self, task_id):
+        deleted = delete_data(COLLECTION_NAME, task_id)
+        if deleted:
+            self._watch_discard([task_id])
+        return deleted
+
+    def delete_many(self, task_ids):
+        result = delete_many(COLLECTION_NAME, list(task_ids))
+        self._watch_discard(result["deleted"])
+        return result
+
+    def archive_many(self, tasks, reason=None):
+        archived_at = datetime.now(timezone.utc)
+        result = move_many(
+            COLLECTION_NAME,
+            ARCHIVE_COLLECTION_NAME,
+            {task.id: {**task.to_document(), "archivedAt": archived_at, "archiveReason": reason} for task in tasks},
+        )
+        self._watch_discard(result["moved"])
+        return {"archived": result["moved"], "failed": result["failed"]}
+
+    def iter_stale_pages(self, expired_before, created_before, page_size):
+        from google.cloud import firestore
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        collection = get_db().collection(COLLECTION_NAME)
+        expired = collection.where(
+            filter=firestore.FieldFilter("isNotified", "==", True)
+        ).where(
+            filter=firestore.FieldFilter("expireDate", "<", expired_before)
+        ).order_by("expireDate")
+        yield from iter_query_pages(expired, page_size, decode=Task.from_snapshot)
+
+        # Drafts are few, and older ones may lack createdAt, so filter them here rather than in the query
+        drafts = collection.where(
+            filter=firestore.FieldFilter("expireDate", "==", None)
+        ).order_by(FieldPath.document_id())
+        for page in iter_query_pages(drafts, page_size, decode=Task.from_snapshot):
+            page = [task for task in page if task.created_at is None or task.created_at < created_before]
+            if page:
+                yield page
+
+    def query(self, field, operator, value, fields=None):
+        return query_data(COLLECTION_NAME, field, operator, value, fields, decode=Task.from_snapshot)
+
+    @timed(FIRESTORE_OPERATION_SECONDS, operation="query_notify_range")
+    def query_notify_range(self, start, end, fields=None):
+        from google.cloud import firestore
+
+        if self.watch is not None and self.watch.synced:
+            return self.watch.pending_in_range(start, end)
+
+        query = get_db().collection(COLLECTION_NAME)
+        if start is not None:
+            query = query.where(filter=firestore.FieldFilter("notifyDate", ">=", start))
+        query = query.where(
+            filter=firestore.FieldFilter("notifyDate", "<=", end)
+        ).where(
+            filter=firestore.FieldFilter("isNotified", "==", False)
+        )
+        if fields is not None:
+            query = query.select(fields)
+
+        return [Task.from_snapshot(doc) for doc in query.stream()]
+
+    def iter_notify_range(self, start, end, page_size, fields=None):
+        from google.cloud import firestore
+
+        if self.watch is not None and self.watch.synced:
+            tasks = self.watch.pending_in_range(start, end)
+            for offset in range(0, len(tasks), page_size):
+                yield tasks[offset:offset + page_size]
+            return
+
+        query = get_db().collection(COLLECTION_NAME).where(
+            filter=firestore.FieldFilter("isNotified", "==", False)
+        )
+        if start is not None:
+            query = query.where(filter=firestore.FieldFilter("notifyDate", ">=", start))
+        query = query.where(
+            filter=firestore.FieldFilter("notifyDate", "<=", end)
+        ).order_by("notifyDate")
+        if fields is not None:
+            # The page cursor needs the ordered field
+            query = query.select(tuple(fields) + (() if "notifyDate" in fields else ("notifyDate",)))
+
+        yield from iter_query_pages(query, page_size, decode=Task.from_snapshot)
+
+    @timed(FIRESTORE_OPERATION_SECONDS, operation="query_pending_for_chat")
+    def query_pending_for_chat(self, notified_id, limit, after=None, fields=None):
+        from google.cloud import firestore
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        query = get_db().collection(COLLECTION_NAME).where(
+            filter=firestore.FieldFilter("notifiedId", "==", notified_id)
+        ).where(
+            filter=firestore.FieldFilter("isNotified", "==", False)
+        ).order_by("notifyDate").order_by(FieldPath.document_id())
+        if after is not None:
+            query = query.start_after({"notifyDate": after[0], "__name__": after[1]})
+        if fields is not None:
+            query = query.select(fields)
+
+        return [Task.from_snapshot(doc) for doc in query.limit(limit).stream()]
+
+    @timed(FIRESTORE_OPERATION_SECONDS, operation="query_delivery_backlog")
+    def query_delivery_backlog(self, fields=None):
+        from google.cloud import firestore
+
+        query = get_db().collection(COLLECTION_NAME).where(
+            filter=firestore.FieldFilter("isNotified", "==", False)
+        ).where(
+            filter=firestore.FieldFilter("deliveryAttempts", ">", 0)
+        )
+        if fields is not None:
+            query = query.select(fields)
+
+        return [Task.from_snapshot(doc) for doc in query.stream()]
+
+    @timed(FIRESTORE_OPERATION_SECONDS, operation="claim")
+    def claim(self, task_id, owner, lease_until, now, due_by):
+        from google.cloud import firestore
+
+        db = get_db()
+        doc_ref = db.collection(COLLECTION_NAME).document(task_id)
+
+        @firestore.transactional
+        def claim_in_transaction(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists or not can_claim(snapshot.to_dict(), owner, now, due_by):
+                return False
+            transaction.update(doc_ref, {"leaseOwner": owner, "leaseExpiresAt": lease_until})
+            return True
+
+        try:
+            return claim_in_transaction(db.transaction())
+        except Exception as e:
+            logger.error("Error claiming task %s: %s", task_id, e)
+            return False
+
+
+def start_task_watch(storage, check_seconds=30, sync_timeout=None):
+    """
+    Serve the storage's due-task scans from a snapshot listener instead of per-call queries.
+
+    :param storage: FirestoreTaskStorage
+    :param check_seconds: How often to check the listener and resubscribe if it stopped
+    :param sync_timeout: Seconds to wait for the first snapshot, or None to return immediately
+    :return: The started TaskWatch
+    """
+    from .firestore_task_watch import TaskWatch
+
+    if storage.watch is None:
+        storage.watch = TaskWatch(COLLECTION_NAME, check_seconds=check_seconds)
+        storage.watch.start(timeout=sync_timeout)
+    return storage.watch
+
+def stop_task_watch(storage):
+    if storage.watch is not None:
+        storage.watch.stop()
+        storage.watch = None
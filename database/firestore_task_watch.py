@@ -0,0 +1,165 @@
+"""
+Local index of unnotified tasks kept current by a Firestore snapshot listener.
+
+Without it, every /notify_check tick (and every scheduler refresh) runs a
+range query over the Task collection even when nothing changed. With watch
+mode on, one `on_snapshot` listener on `isNotified == False` delivers the
+full set once and then only the documents that change, and due-task scans
+are answered from memory with no per-tick reads.
+
+The listener can stop on its own (network errors, server-side resets); a
+monitor thread notices and re-subscribes, and until the new listener has
+delivered its first snapshot the storage falls back to querying Firestore.
+Claiming a task re-reads it in a transaction and checks isNotified, the
+lease and that notifyDate is still within the scanned range, so a stale
+index entry cannot notify a task twice or ahead of a notifyDate that has
+since moved later.
+"""
+import logging
+import threading
+import time
+
+from utils.metrics import Counter
+
+from .firestore_init import get_db
+from .task_model import Task
+
+logger = logging.getLogger(__name__)
+
+TASK_WATCH_RESYNCS = Counter(
+    "yangbot_task_watch_resyncs_total",
+    "Times the unnotified-task snapshot listener was restarted after stopping",
+)
+
+
+class TaskWatch:
+    def __init__(self, collection_name, check_seconds=30):
+        """
+        :param collection_name: Task collection to listen to
+        :param check_seconds: How often to check that the listener is still running
+        """
+        self.collection_name = collection_name
+        self.check_seconds = check_seconds
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._generation = 0
+        self._subscribed_at = 0.0
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._monitor = None
+        self.resyncs = 0
+
+    @property
+    def synced(self):
+        """Whether the index reflects a live listener's latest snapshot."""
+        listener = self._listener
+        return self._synced.is_set() and listener is not None and listener.is_active
+
+    def start(self, timeout=None):
+        """
+        Subscribe and start the monitor thread.
+
+        :param timeout: Seconds to wait for the first snapshot, or None to return immediately
+        """
+        self._stopped.clear()
+        self._subscribe()
+        self._monitor = threading.Thread(target=self._run_monitor, name="task-watch", daemon=True)
+        self._monitor.start()
+        if timeout is not None:
+            self._synced.wait(timeout)
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        self._unsubscribe()
+        if self._monitor:
+            self._monitor.join(timeout)
+            self._monitor = None
+
+    def resync(self):
+        """Drop the current listener and subscribe again; the new one starts from a full snapshot."""
+        self.resyncs += 1
+        TASK_WATCH_RESYNCS.inc()
+        self._unsubscribe()
+        self._subscribe()
+
+    def _subscribe(self):
+        from google.cloud import firestore
+
+        query = get_db().collection(self.collection_name).where(
+            filter=firestore.FieldFilter("isNotified", "==", False)
+        )
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._synced.clear()
+        self._subscribed_at = time.monotonic()
+        self._listener = query.on_snapshot(
+            lambda docs, changes, read_time: self._on_snapshot(generation, docs, changes)
+        )
+
+    def _unsubscribe(self):
+        listener, self._listener = self._listener, None
+        self._synced.clear()
+        if listener is not None:
+            try:
+                listener.unsubscribe()
+            except Exception as e:
+                logger.debug("Error closing task listener: %s", e)
+
+    def _on_snapshot(self, generation, docs, changes):
+        try:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                if not self._synced.is_set():
+                    # The first snapshot of a listener is the complete result set
+                    self._tasks = {doc.id: Task.from_snapshot(doc) for doc in docs}
+                else:
+                    for change in changes:
+                        if change.type.name == "REMOVED":
+                            self._tasks.pop(change.document.id, None)
+                        else:
+                            self._tasks[change.document.id] = Task.from_snapshot(change.document)
+                self._synced.set()
+        except Exception as e:
+            # Raising here would kill the listener; the next snapshot rebuilds the index from its full document list
+            logger.exception("Error applying task snapshot: %s", e)
+            self._synced.clear()
+
+    def _run_monitor(self):
+        while not self._stopped.wait(self.check_seconds):
+            listener = self._listener
+            if listener is not None and listener.is_active:
+                # A live listener gets one check interval to deliver its first snapshot
+                if self._synced.is_set() or time.monotonic() - self._subscribed_at < self.check_seconds:
+                    continue
+            logger.warning("Task snapshot listener stopped or never synced, resubscribing")
+            try:
+                self.resync()
+            except Exception as e:
+                logger.exception("Error resubscribing task listener: %s", e)
+
+    def discard(self, task_ids):
+        """Remove tasks from the index ahead of the listener, e.g. right after marking them notified."""
+        with self._lock:
+            for task_id in task_ids:
+                self._tasks.pop(task_id, None)
+
+    def pending_in_range(self, start, end):
+        """
+        :param start: Lower bound (inclusive) for notifyDate, or None for no lower bound
+        :param end: Upper bound (inclusive) for notifyDate
+        :return: Copies of the indexed unnotified tasks in the range, ordered by notifyDate then ID
+        """
+        with self._lock:
+            tasks = [
+                task.copy() for task in self._tasks.values()
+                if task.notify_date is not None and task.notify_date <= end
+                and (start is None or task.notify_date >= start)
+            ]
+        tasks.sort(key=lambda task: (task.notify_date, task.id))
+        return tasks
+
+    def __len__(self):
+        return len(self._tasks)
@@ -0,0 +1,136 @@
+import operator
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from .task_model import Task
+from .task_storage import TaskStorage, can_claim
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class MemoryTaskStorage(TaskStorage):
+    """Task storage kept in a dictionary. For tests, load tests and benchmarks."""
+
+    def __init__(self):
+        self._tasks = {}
+        self._archive = {}
+        self._lock = threading.Lock()
+
+    def create(self, data, task_id=None):
+        task_id = task_id or uuid.uuid4().hex[:20]
+        data = dict(data)
+        with self._lock:
+            if self._tasks.setdefault(task_id, data) is not data:
+                return None
+        return task_id
+
+    def get(self, task_id, fields=None):
+        with self._lock:
+            data = self._tasks.get(task_id)
+            return Task.from_document(task_id, data, fields) if data is not None else None
+
+    def get_many(self, task_ids, fields=None):
+        with self._lock:
+            return [
+                Task.from_document(task_id, self._tasks[task_id], fields) if task_id in self._tasks else None
+                for task_id in task_ids
+            ]
+
+    def update(self, task_id, updates):
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            self._tasks[task_id].update(updates)
+            return True
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+        return True
+
+    def archive_many(self, tasks, reason=None):
+        archived_at = datetime.now(timezone.utc)
+        archived = []
+        with self._lock:
+            for task in tasks:
+                if self._tasks.pop(task.id, None) is not None:
+                    self._archive[task.id] = {**task.to_document(), "archivedAt": archived_at, "archiveReason": reason}
+                    archived.append(task.id)
+        return {"archived": archived, "failed": {}}
+
+    def iter_stale_pages(self, expired_before, created_before, page_size):
+        with self._lock:
+            tasks = [
+                Task.from_document(task_id, data)
+                for task_id, data in self._tasks.items()
+                if (data.get("isNotified") and data.get("expireDate") is not None and data["expireDate"] < expired_before)
+                or (data.get("expireDate") is None and (data.get("createdAt") is None or data["createdAt"] < created_before))
+            ]
+        for offset in range(0, len(tasks), page_size):
+            yield tasks[offset:offset + page_size]
+
+    def query(self, field, operator, value, fields=None):
+        compare = OPERATORS[operator]
+
+        def matches(data):
+            if operator == "==" and value is None:
+                return data.get(field) is None
+            return data.get(field) is not None and compare(data[field], value)
+
+        with self._lock:
+            return [Task.from_document(task_id, data, fields) for task_id, data in self._tasks.items() if matches(data)]
+
+    def query_notify_range(self, start, end, fields=None):
+        with self._lock:
+            return [
+                Task.from_document(task_id, data, fields)
+                for task_id, data in self._tasks.items()
+                if data.get("isNotified") is False
+                and data.get("notifyDate") is not None
+                and (start is None or data["notifyDate"] >= start)
+                and data["notifyDate"] <= end
+            ]
+
+    def iter_notify_range(self, start, end, page_size, fields=None):
+        tasks = sorted(self.query_notify_range(start, end), key=lambda task: (task.notify_date, task.id))
+        if fields is not None:
+            tasks = [Task.from_document(task.id, task.to_document(fields)) for task in tasks]
+        for offset in range(0, len(tasks), page_size):
+            yield tasks[offset:offset + page_size]
+
+    def query_pending_for_chat(self, notified_id, limit, after=None, fields=None):
+        with self._lock:
+            keys = sorted(
+                (data["notifyDate"], task_id)
+                for task_id, data in self._tasks.items()
+                if data.get("notifiedId") == notified_id
+                and data.get("isNotified") is False
+                and data.get("notifyDate") is not None
+            )
+            if after is not None:
+                keys = [key for key in keys if key > tuple(after)]
+            return [Task.from_document(task_id, self._tasks[task_id], fields) for _, task_id in keys[:limit]]
+
+    def query_delivery_backlog(self, fields=None):
+        with self._lock:
+            return [
+                Task.from_document(task_id, data, fields)
+                for task_id, data in self._tasks.items()
+                if data.get("isNotified") is False and (data.get("deliveryAttempts") or 0) > 0
+            ]
+
+    def claim(self, task_id, owner, lease_until, now, due_by):
+        with self._lock:
+            data = self._tasks.get(task_id)
+            if data is None or not can_claim(data, owner, now, due_by):
+                return False
+            data.update({"leaseOwner": owner, "leaseExpiresAt": lease_until})
+            return True
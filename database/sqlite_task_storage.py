@@ -0,0 +1,276 @@
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from .task_model import FIELD_ATTRIBUTES, Task
+from .task_storage import TASK_FIELDS, TaskStorage
+
+TABLE_NAME = "Task"
+ARCHIVE_TABLE_NAME = "TaskArchive"
+DATETIME_FIELDS = {"expireDate", "notifyDate", "leaseExpiresAt", "createdAt", "deliveryDueAt"}
+COLUMN_TYPES = {
+    "message": "TEXT",
+    "sourceId": "TEXT",
+    "notifiedId": "TEXT",
+    "isNotified": "INTEGER",
+    "expireDate": "REAL",
+    "notifyDate": "REAL",
+    "leaseOwner": "TEXT",
+    "leaseExpiresAt": "REAL",
+    "createdAt": "REAL",
+    "deliveryAttempts": "INTEGER",
+    "lastDeliveryError": "TEXT",
+    "deliveryDueAt": "REAL",
+}
+# Extra columns of the archive table
+ARCHIVE_COLUMN_TYPES = {
+    "archivedAt": "REAL",
+    "archiveReason": "TEXT",
+}
+OPERATORS = {"==", "!=", "<", "<=", ">", ">="}
+# Stay under SQLite's default limit on bound parameters per statement
+MAX_IN_PARAMETERS = 500
+
+logger = logging.getLogger(__name__)
+
+
+def to_column(field, value):
+    if value is None:
+        return None
+    if field in DATETIME_FIELDS:
+        return value.timestamp()
+    if field == "isNotified":
+        return int(value)
+    return value
+
+def from_column(field, value):
+    if value is None:
+        return None
+    if field in DATETIME_FIELDS:
+        return datetime.fromtimestamp(value, timezone.utc)
+    if field == "isNotified":
+        return bool(value)
+    return value
+
+
+class SQLiteTaskStorage(TaskStorage):
+    """
+    Task storage in a local SQLite file, one column per task field.
+    Datetimes are stored as UTC epoch seconds so range queries can use the
+    (isNotified, notifyDate) index.
+    """
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(f"{field} {COLUMN_TYPES[field]}" for field in TASK_FIELDS)
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} (id TEXT PRIMARY KEY, {columns})")
+            archive_columns = ", ".join(f"{column} {kind}" for column, kind in ARCHIVE_COLUMN_TYPES.items())
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE_NAME} (id TEXT PRIMARY KEY, {columns}, {archive_columns})"
+            )
+            # Tables created by older versions lack the newer columns
+            for table, column_types in ((TABLE_NAME, COLUMN_TYPES), (ARCHIVE_TABLE_NAME, {**COLUMN_TYPES, **ARCHIVE_COLUMN_TYPES})):
+                existing = {row[1] for row in self._connection.execute(f"PRAGMA table_info({table})")}
+                for column, kind in column_types.items():
+                    if column not in existing:
+                        self._connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_task_notify ON {TABLE_NAME} (isNotified, notifyDate)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_task_chat ON {TABLE_NAME} (notifiedId, isNotified, notifyDate)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_task_delivery ON {TABLE_NAME} (isNotified, deliveryAttempts)"
+            )
+
+    def _select(self, where, params, suffix="", fields=None):
+        fields = TASK_FIELDS if fields is None else tuple(field for field in fields if field in TASK_FIELDS)
+        columns = ", ".join(("id",) + fields)
+        with self._lock:
+            rows = self._connection.execute(f"SELECT {columns} FROM {TABLE_NAME} WHERE {where} {suffix}", params).fetchall()
+        return [
+            Task.from_document(row[0], {field: from_column(field, value) for field, value in zip(fields, row[1:])})
+            for row in rows
+        ]
+
+    def create(self, data, task_id=None):
+        task_id = task_id or uuid.uuid4().hex[:20]
+        fields = [field for field in TASK_FIELDS if field in data]
+        placeholders = ", ".join("?" for _ in range(len(fields) + 1))
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(
+                    f"INSERT INTO {TABLE_NAME} (id, {', '.join(fields)}) VALUES ({placeholders})",
+                    [task_id] + [to_column(field, data[field]) for field in fields],
+                )
+            return task_id
+        except sqlite3.IntegrityError:
+            logger.debug("Task %s already exists", task_id)
+            return None
+        except sqlite3.Error as e:
+            logger.error("Error writing task to SQLite: %s", e)
+            return None
+
+    def _iter_pages(self, where, params, order_fields, page_size, fields=None):
+        """Keyset-paginate a query ordered by `order_fields` then id. A projection must include `order_fields`."""
+        order = ", ".join(order_fields + ("id",))
+        suffix = f"ORDER BY {order} LIMIT {int(page_size)}"
+        cursor = None
+        while True:
+            if cursor is None:
+                page = self._select(where, params, suffix, fields)
+            else:
+                placeholders = ", ".join("?" for _ in cursor)
+                page = self._select(f"{where} AND ({order}) > ({placeholders})", list(params) + cursor, suffix, fields)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            cursor = [to_column(field, getattr(last, FIELD_ATTRIBUTES[field])) for field in order_fields] + [last.id]
+
+    def get(self, task_id, fields=None):
+        tasks = self._select("id = ?", (task_id,), fields=fields)
+        return tasks[0] if tasks else None
+
+    def get_many(self, task_ids, fields=None):
+        task_ids = list(task_ids)
+        found = {}
+        unique_ids = list(dict.fromkeys(task_ids))
+        for offset in range(0, len(unique_ids), MAX_IN_PARAMETERS):
+            chunk = unique_ids[offset:offset + MAX_IN_PARAMETERS]
+            placeholders = ", ".join("?" for _ in chunk)
+            for task in self._select(f"id IN ({placeholders})", chunk, fields=fields):
+                found[task.id] = task
+        return [found.get(task_id) for task_id in task_ids]
+
+    def update(self, task_id, updates):
+        fields = [field for field in TASK_FIELDS if field in updates]
+        if not fields:
+            return False
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        try:
+            with self._lock, self._connection:
+                cursor = self._connection.execute(
+                    f"UPDATE {TABLE_NAME} SET {assignments} WHERE id = ?",
+                    [to_column(field, updates[field]) for field in fields] + [task_id],
+                )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logger.error("Error updating task in SQLite: %s", e)
+            return False
+
+    def delete(self, task_id):
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {TABLE_NAME} WHERE id = ?", (task_id,))
+        return True
+
+    def query(self, field, operator, value, fields=None):
+        if field not in TASK_FIELDS or operator not in OPERATORS:
+            raise ValueError(f"Unsupported query: {field} {operator}")
+        if value is None and operator == "==":
+            return self._select(f"{field} IS NULL", (), fields=fields)
+        sql_operator = "=" if operator == "==" else operator
+        return self._select(f"{field} {sql_operator} ?", (to_column(field, value),), fields=fields)
+
+    def query_notify_range(self, start, end, fields=None):
+        if start is None:
+            return self._select("isNotified = 0 AND notifyDate <= ?", (to_column("notifyDate", end),), fields=fields)
+        return self._select(
+            "isNotified = 0 AND notifyDate BETWEEN ? AND ?",
+            (to_column("notifyDate", start), to_column("notifyDate", end)),
+            fields=fields,
+        )
+
+    def iter_notify_range(self, start, end, page_size, fields=None):
+        where = "isNotified = 0 AND notifyDate <= ?"
+        params = [to_column("notifyDate", end)]
+        if start is not None:
+            where += " AND notifyDate >= ?"
+            params.append(to_column("notifyDate", start))
+
+        if fields is not None and "notifyDate" not in fields:
+            # The page cursor needs the ordered field
+            fields = tuple(fields) + ("notifyDate",)
+
+        yield from self._iter_pages(where, params, ("notifyDate",), page_size, fields)
+
+    def delete_many(self, task_ids):
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {"deleted": [], "failed": {}}
+        placeholders = ", ".join("?" for _ in task_ids)
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(f"DELETE FROM {TABLE_NAME} WHERE id IN ({placeholders})", task_ids)
+            return {"deleted": task_ids, "failed": {}}
+        except sqlite3.Error as e:
+            logger.error("Error deleting tasks in SQLite: %s", e)
+            return {"deleted": [], "failed": {task_id: str(e) for task_id in task_ids}}
+
+    def archive_many(self, tasks, reason=None):
+        task_ids = [task.id for task in tasks]
+        if not task_ids:
+            return {"archived": [], "failed": {}}
+        columns = ", ".join(("id",) + TASK_FIELDS + ("archivedAt", "archiveReason"))
+        placeholders = ", ".join("?" for _ in range(len(TASK_FIELDS) + 3))
+        archived_at = datetime.now(timezone.utc).timestamp()
+        archived = []
+        try:
+            with self._lock, self._connection:
+                # Copy the given Tasks, which may carry changes not yet written, e.g. a dead letter's last error
+                for task in tasks:
+                    if self._connection.execute(f"DELETE FROM {TABLE_NAME} WHERE id = ?", (task.id,)).rowcount:
+                        self._connection.execute(
+                            f"INSERT OR REPLACE INTO {ARCHIVE_TABLE_NAME} ({columns}) VALUES ({placeholders})",
+                            [task.id] + [to_column(field, value) for field, value in task.to_document().items()]
+                            + [archived_at, reason],
+                        )
+                        archived.append(task.id)
+            return {"archived": archived, "failed": {}}
+        except sqlite3.Error as e:
+            logger.error("Error archiving tasks in SQLite: %s", e)
+            return {"archived": [], "failed": {task_id: str(e) for task_id in task_ids}}
+
+    def iter_stale_pages(self, expired_before, created_before, page_size):
+        yield from self._iter_pages(
+            "isNotified = 1 AND expireDate < ?",
+            [to_column("expireDate", expired_before)],
+            ("expireDate",),
+            page_size,
+        )
+        yield from self._iter_pages(
+            "expireDate IS NULL AND (createdAt IS NULL OR createdAt < ?)",
+            [to_column("createdAt", created_before)],
+            (),
+            page_size,
+        )
+
+    def query_pending_for_chat(self, notified_id, limit, after=None, fields=None):
+        where = "notifiedId = ? AND isNotified = 0 AND notifyDate IS NOT NULL"
+        params = [notified_id]
+        if after is not None:
+            where += " AND (notifyDate, id) > (?, ?)"
+            params += [to_column("notifyDate", after[0]), after[1]]
+        return self._select(where, params, f"ORDER BY notifyDate, id LIMIT {int(limit)}", fields)
+
+    def query_delivery_backlog(self, fields=None):
+        return self._select("isNotified = 0 AND deliveryAttempts > 0", (), fields=fields)
+
+    def claim(self, task_id, owner, lease_until, now, due_by):
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                f"UPDATE {TABLE_NAME} SET leaseOwner = ?, leaseExpiresAt = ? "
+                "WHERE id = ? AND isNotified = 0 AND notifyDate <= ? "
+                "AND (leaseOwner IS NULL OR leaseExpiresAt IS NULL OR leaseExpiresAt <= ?)",
+                (owner, to_column("leaseExpiresAt", lease_until), task_id,
+                 to_column("notifyDate", due_by), to_column("leaseExpiresAt", now)),
+            )
+        return cursor.rowcount == 1
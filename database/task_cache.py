@@ -0,0 +1,67 @@
+"""
+In-memory TTL/LRU cache of Task records keyed by task ID.
+
+task_operations keeps it write-through: creates and updates are merged into
+the cached copy, so a handler that updates a task and then renders it does
+not need a second Firestore read.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TaskCache:
+    def __init__(self, max_size=1024, ttl_seconds=300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, task_id):
+        """Return a copy of the cached task, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[task_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return entry[1].copy()
+
+    def put(self, task_id, task):
+        with self._lock:
+            self._entries[task_id] = (time.monotonic() + self.ttl_seconds, task.copy())
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def merge(self, task_id, updates):
+        """
+        Apply updates to the cached task, if present. The entry's TTL is left unchanged.
+
+        :param updates: Dictionary of document field name -> value
+        """
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is not None:
+                entry[1].apply(updates)
+
+    def invalidate(self, task_id=None):
+        """Drop one task, or every task when task_id is None."""
+        with self._lock:
+            if task_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(task_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
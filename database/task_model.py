@@ -0,0 +1,104 @@
+"""
+Task record.
+
+A Task holds the fields of one Task document in __slots__, which is smaller
+and faster to read than the per-document dictionaries it replaces. Storage
+backends build Tasks with `Task.from_document` and write them back with
+`to_document`, so the mapping between document field names (camelCase) and
+attributes lives in one place. Fields left out by a projection are None.
+"""
+from .task_storage import TASK_FIELDS
+
+# Document field name -> Task attribute name
+FIELD_ATTRIBUTES = {
+    "message": "message",
+    "sourceId": "source_id",
+    "notifiedId": "notified_id",
+    "isNotified": "is_notified",
+    "expireDate": "expire_date",
+    "notifyDate": "notify_date",
+    "leaseOwner": "lease_owner",
+    "leaseExpiresAt": "lease_expires_at",
+    "createdAt": "created_at",
+    "deliveryAttempts": "delivery_attempts",
+    "lastDeliveryError": "last_delivery_error",
+    "deliveryDueAt": "delivery_due_at",
+}
+
+
+class Task:
+    __slots__ = ("id",) + tuple(FIELD_ATTRIBUTES[field] for field in TASK_FIELDS)
+
+    def __init__(self, id, message=None, source_id=None, notified_id=None, is_notified=None,
+                 expire_date=None, notify_date=None, lease_owner=None, lease_expires_at=None, created_at=None,
+                 delivery_attempts=None, last_delivery_error=None, delivery_due_at=None):
+        self.id = id
+        self.message = message
+        self.source_id = source_id
+        self.notified_id = notified_id
+        self.is_notified = is_notified
+        self.expire_date = expire_date
+        self.notify_date = notify_date
+        self.lease_owner = lease_owner
+        self.lease_expires_at = lease_expires_at
+        self.created_at = created_at
+        self.delivery_attempts = delivery_attempts
+        self.last_delivery_error = last_delivery_error
+        self.delivery_due_at = delivery_due_at
+
+    @classmethod
+    def from_document(cls, task_id, data, fields=None):
+        """
+        Build a Task from document fields.
+
+        :param task_id: Task ID (document ID)
+        :param data: Dictionary of document field name -> value
+        :param fields: Only keep these document fields, or None for all
+        :return: Task
+        """
+        if fields is not None:
+            data = {field: data[field] for field in fields if field in data}
+        get = data.get
+        return cls(
+            task_id,
+            get("message"),
+            get("sourceId"),
+            get("notifiedId"),
+            get("isNotified"),
+            get("expireDate"),
+            get("notifyDate"),
+            get("leaseOwner"),
+            get("leaseExpiresAt"),
+            get("createdAt"),
+            get("deliveryAttempts"),
+            get("lastDeliveryError"),
+            get("deliveryDueAt"),
+        )
+
+    @classmethod
+    def from_snapshot(cls, doc):
+        """Build a Task from a Firestore DocumentSnapshot."""
+        return cls.from_document(doc.id, doc.to_dict())
+
+    def to_document(self, fields=TASK_FIELDS):
+        """
+        :param fields: Document fields to include
+        :return: Dictionary of document field name -> value, without the ID
+        """
+        return {field: getattr(self, FIELD_ATTRIBUTES[field]) for field in fields}
+
+    def apply(self, updates):
+        """Apply a dictionary of document field name -> value in place."""
+        for field, value in updates.items():
+            setattr(self, FIELD_ATTRIBUTES[field], value)
+
+    def copy(self):
+        return Task(*(getattr(self, attribute) for attribute in self.__slots__))
+
+    def __eq__(self, other):
+        if not isinstance(other, Task):
+            return NotImplemented
+        return all(getattr(self, attribute) == getattr(other, attribute) for attribute in self.__slots__)
+
+    def __repr__(self):
+        return f"Task(id={self.id!r}, notified_id={self.notified_id!r}, notify_date={self.notify_date!r})"
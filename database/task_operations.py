@@ -1,22 +1,53 @@
+import logging
+import zlib
 from datetime import datetime, timedelta, timezone
 
-from google.cloud import firestore
+from .task_cache import TaskCache
+from .task_model import Task
+from .task_storage import TASK_FIELDS, get_task_storage
 
-from .firestore_init import db
-from .firestore_operations import (delete_data, query_data, read_data,
-                                   update_data, write_data)
+logger = logging.getLogger(__name__)
 
-COLLECTION_NAME = "Task"
+task_cache = TaskCache()
 
-def create_task(message, source_id, notified_id, is_notified, expire_date):
+# Document fields shown in a chat's task list
+TASK_LIST_FIELDS = ("message", "notifiedId", "isNotified", "expireDate", "notifyDate", "deliveryDueAt")
+
+def configure_task_cache(max_size, ttl_seconds):
+    """
+    Replace the task cache with one using the given limits.
+
+    :param max_size: Maximum number of cached tasks
+    :param ttl_seconds: Seconds a cached task stays valid
+    """
+    global task_cache
+    task_cache = TaskCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+def invalidate_task(task_id=None):
+    """
+    Drop a task from the cache so the next get_task reads the storage backend.
+
+    :param task_id: Task ID (document ID), or None to clear the whole cache
+    """
+    task_cache.invalidate(task_id)
+
+def get_task_cache_stats():
+    """
+    :return: Dictionary with cache size, hits and misses
     """
-    Create a new Task document in Firestore.
+    return task_cache.stats()
+
+def create_task(message, source_id, notified_id, is_notified, expire_date, notify_date=None, task_id=None):
+    """
+    Create a new Task document.
 
     :param message: Task message/content
     :param source_id: Source identifier
     :param notified_id: Notification identifier
     :param is_notified: Boolean indicating if notification is enabled
     :param expire_date: Expiration date (datetime object only)
+    :param notify_date: Notification date, if already chosen
+    :param task_id: Document ID to create the task under, or None to generate one; fails if the ID is taken
     :return: Created Task document ID
     """
     try:
@@ -25,11 +56,17 @@ def create_task(message, source_id, notified_id, is_notified, expire_date):
             "sourceId": source_id,
             "notifiedId": notified_id,
             "isNotified": is_notified,
-            "expireDate": expire_date
+            "expireDate": expire_date,
+            "createdAt": datetime.now(timezone.utc),
         }
-        return write_data(COLLECTION_NAME, None, data)
+        if notify_date is not None:
+            data["notifyDate"] = notify_date
+        task_id = get_task_storage().create(data, task_id)
+        if task_id:
+            task_cache.put(task_id, Task.from_document(task_id, data))
+        return task_id
     except Exception as e:
-        print(f"Error creating task: {e}")
+        logger.error("Error creating task: %s", e)
         return None
 
 
@@ -38,9 +75,39 @@ def get_task(task_id):
     Retrieve a Task document by ID.
 
     :param task_id: Task ID (document ID)
-    :return: Task data dictionary or None if not found
+    :return: Task or None if not found
     """
-    return read_data(COLLECTION_NAME, task_id)
+    task = task_cache.get(task_id)
+    if task is None:
+        task = get_task_storage().get(task_id)
+        if task is not None:
+            task_cache.put(task_id, task)
+    return task
+
+def get_tasks(task_ids):
+    """
+    Retrieve many Task documents, serving what it can from the cache and
+    fetching the rest with batched reads instead of one round trip per ID.
+
+    :param task_ids: Task IDs (document IDs)
+    :return: List of Tasks in the order of `task_ids`, None for tasks not found
+    """
+    task_ids = list(task_ids)
+    tasks = [task_cache.get(task_id) for task_id in task_ids]
+    missing = list(dict.fromkeys(task_id for task_id, task in zip(task_ids, tasks) if task is None))
+    if not missing:
+        return tasks
+
+    try:
+        fetched = dict(zip(missing, get_task_storage().get_many(missing)))
+    except Exception as e:
+        logger.error("Error reading %d tasks: %s", len(missing), e)
+        fetched = {}
+    for task_id, task in fetched.items():
+        if task is not None:
+            task_cache.put(task_id, task)
+
+    return [task if task is not None else fetched.get(task_id) for task_id, task in zip(task_ids, tasks)]
 
 def update_task(task_id, updates):
     """
@@ -52,19 +119,39 @@ def update_task(task_id, updates):
     """
     try:
         # Validate that updates only include valid fields
-        valid_fields = {"message", "sourceId", "notifiedId", "isNotified", "expireDate", "notifyDate"}
-        filtered_updates = {k: v for k, v in updates.items() if k in valid_fields}
+        filtered_updates = {k: v for k, v in updates.items() if k in TASK_FIELDS}
 
         if not filtered_updates:
-            print("No valid fields to update")
+            logger.warning("No valid fields to update")
+            return False
+
+        if not get_task_storage().update(task_id, filtered_updates):
+            task_cache.invalidate(task_id)
             return False
 
-        update_data(COLLECTION_NAME, task_id, filtered_updates)
+        task_cache.merge(task_id, filtered_updates)
         return True
     except Exception as e:
-        print(f"Error updating task: {e}")
+        logger.error("Error updating task: %s", e)
         return False
 
+def mark_tasks_notified(task_ids):
+    """
+    Mark many Task documents as notified (batched writes on Firestore).
+
+    :param task_ids: List of Task IDs (document IDs)
+    :return: Dictionary with 'updated' (list of IDs) and 'failed' (ID -> error message)
+    """
+    if not task_ids:
+        return {"updated": [], "failed": {}}
+
+    result = get_task_storage().update_many(list(task_ids), {"isNotified": True})
+    for task_id in result["updated"]:
+        task_cache.merge(task_id, {"isNotified": True})
+    for task_id, error in result["failed"].items():
+        logger.error("Error marking task %s notified: %s", task_id, error)
+    return result
+
 def delete_task(task_id):
     """
     Delete a Task document by ID.
@@ -73,51 +160,224 @@ def delete_task(task_id):
     :return: True if successful, False otherwise
     """
     try:
-        delete_data(COLLECTION_NAME, task_id)
-        return True
+        task_cache.invalidate(task_id)
+        return get_task_storage().delete(task_id)
     except Exception as e:
-        print(f"Error deleting task: {e}")
+        logger.error("Error deleting task: %s", e)
         return False
 
-def get_tasks_by_is_notified(is_notified):
+def reschedule_task_delivery(task, error, next_attempt_at):
+    """
+    Record a failed notification push and schedule the next attempt by moving
+    notifyDate, releasing the lease so any instance can retry it.
+
+    :param task: Task with at least notifyDate, deliveryAttempts and deliveryDueAt
+    :param error: Description of the failure
+    :param next_attempt_at: When to retry
+    :return: True if successful, False otherwise
+    """
+    return update_task(task.id, {
+        "deliveryAttempts": (task.delivery_attempts or 0) + 1,
+        "lastDeliveryError": error,
+        # The notifyDate the user picked, kept for display and backlog age
+        "deliveryDueAt": task.delivery_due_at or task.notify_date,
+        "notifyDate": next_attempt_at,
+        "leaseOwner": None,
+        "leaseExpiresAt": None,
+    })
+
+def dead_letter_tasks(failures):
+    """
+    Move tasks whose notification can never be delivered to the archive with
+    archiveReason "deadLetter", recording the last error.
+
+    :param failures: List of (Task, error description) pairs; the Tasks may be projected
+    :return: Dictionary with 'archived' (list of IDs) and 'failed' (ID -> error message)
+    """
+    # The archive copies every field, so load the complete tasks in one batched read
+    complete = get_tasks(task.id for task, _ in failures)
+    tasks = []
+    for (_, error), task in zip(failures, complete):
+        if task is None:
+            continue
+        task.apply({"deliveryAttempts": (task.delivery_attempts or 0) + 1, "lastDeliveryError": error,
+                    "leaseOwner": None, "leaseExpiresAt": None})
+        tasks.append(task)
+
+    result = get_task_storage().archive_many(tasks, reason="deadLetter")
+    for task_id in result["archived"]:
+        task_cache.invalidate(task_id)
+    for task_id, error in result["failed"].items():
+        logger.error("Error dead-lettering task %s: %s", task_id, error)
+    return result
+
+def get_delivery_backlog():
+    """
+    Unnotified tasks waiting for a notification retry.
+
+    :return: List of Tasks with isNotified, notifyDate, deliveryAttempts and deliveryDueAt
+    """
+    return get_task_storage().query_delivery_backlog(
+        fields=("isNotified", "notifyDate", "deliveryAttempts", "deliveryDueAt")
+    )
+
+def purge_stale_tasks(expired_before, created_before, page_size=200, archive=False, dry_run=False):
+    """
+    Delete or archive tasks that are no longer needed: notified tasks whose
+    expireDate is before `expired_before`, and drafts (no expireDate, the
+    picker was never used) created before `created_before`.
+
+    Stale tasks are scanned page by page and each page is removed with
+    batched writes.
+
+    :param expired_before: Cutoff for the expireDate of notified tasks
+    :param created_before: Cutoff for the createdAt of drafts
+    :param page_size: Number of tasks fetched and removed per batch
+    :param archive: Move tasks to the archive instead of deleting them
+    :param dry_run: Only count the stale tasks
+    :return: Dictionary of counts: expired, abandoned, removed, failed, plus archive and dryRun
+    """
+    storage = get_task_storage()
+    counts = {"expired": 0, "abandoned": 0, "removed": 0, "failed": 0, "archive": archive, "dryRun": dry_run}
+
+    for page in storage.iter_stale_pages(expired_before, created_before, page_size):
+        expired = sum(1 for task in page if task.is_notified)
+        counts["expired"] += expired
+        counts["abandoned"] += len(page) - expired
+        if dry_run:
+            continue
+
+        if archive:
+            result = storage.archive_many(page)
+            removed = result["archived"]
+        else:
+            result = storage.delete_many([task.id for task in page])
+            removed = result["deleted"]
+        for task_id in removed:
+            task_cache.invalidate(task_id)
+        for task_id, error in result["failed"].items():
+            logger.error("Error removing stale task %s: %s", task_id, error)
+        counts["removed"] += len(removed)
+        counts["failed"] += len(result["failed"])
+
+    return counts
+
+def get_tasks_by_is_notified(is_notified, fields=None):
     """
     Retrieve tasks filtered by isNotified status.
 
     :param is_notified: Boolean value to filter by
-    :return: List of task dictionaries
+    :param fields: Document fields to fetch, or None for all
+    :return: List of Tasks
     """
-    return query_data(COLLECTION_NAME, "isNotified", "==", is_notified)
+    return get_task_storage().query("isNotified", "==", is_notified, fields)
 
-def get_tasks_by_source_id(source_id):
+def get_tasks_by_source_id(source_id, fields=None):
     """
     Retrieve tasks filtered by sourceId.
 
     :param source_id: Source ID to filter by
-    :return: List of task dictionaries
+    :param fields: Document fields to fetch, or None for all
+    :return: List of Tasks
+    """
+    return get_task_storage().query("sourceId", "==", source_id, fields)
+
+def get_pending_tasks_for_chat(notified_id, page_size, after=None):
+    """
+    One page of a chat's unnotified, scheduled tasks.
+
+    Pages are cut by notifyDate, which the storage can order on. Within a
+    page, tasks are ordered by the time the user picked: deliveryDueAt for
+    tasks waiting for a delivery retry (their notifyDate is the retry time),
+    otherwise notifyDate.
+
+    :param notified_id: Chat (group or room) ID
+    :param page_size: Maximum number of tasks to return
+    :param after: Cursor returned with the previous page, or None for the first page
+    :return: Tuple of (list of Tasks, cursor for the next page or None if this is the last page)
     """
-    return query_data(COLLECTION_NAME, "sourceId", "==", source_id)
+    # One extra task tells whether another page follows
+    tasks = get_task_storage().query_pending_for_chat(notified_id, page_size + 1, after, TASK_LIST_FIELDS)
+    next_cursor = None
+    if len(tasks) > page_size:
+        tasks = tasks[:page_size]
+        next_cursor = (tasks[-1].notify_date, tasks[-1].id)
+    tasks.sort(key=lambda task: (task.delivery_due_at or task.notify_date, task.id))
+    return tasks, next_cursor
 
-def get_notify_tasks():
+def get_notify_tasks(fields=None):
     """
     Retrieve tasks that need notification (expireDate within next day and isNotified is False).
     The timestamp range is from (now - 1 minute) to (now).
 
-    :return: List of task dictionaries
+    :param fields: Document fields to fetch, or None for all
+    :return: List of Tasks
     """
     now = datetime.now(timezone.utc)
     one_minute_ago = now - timedelta(minutes=1)
 
-    tasks_ref = db.collection(COLLECTION_NAME)
-    results = tasks_ref.where(
-        filter=firestore.FieldFilter("notifyDate", ">=", one_minute_ago)
-    ).where(
-        filter=firestore.FieldFilter("notifyDate", "<=", now)
-    ).where(
-        filter=firestore.FieldFilter("isNotified", "==", False)
-    ).stream()
+    return get_task_storage().query_notify_range(one_minute_ago, now, fields)
 
-    docs = []
-    for doc in results:
-        docs.append({**doc.to_dict(), 'id': doc.id})
+def get_pending_notify_tasks(until, fields=None):
+    """
+    Retrieve tasks that are not notified yet and whose notifyDate is at or before `until`.
+    Unlike get_notify_tasks there is no lower bound, so overdue tasks are included.
+
+    :param until: Upper bound (inclusive) for notifyDate, timezone-aware datetime
+    :param fields: Document fields to fetch, or None for all
+    :return: List of Tasks
+    """
+    return get_task_storage().query_notify_range(None, until, fields)
+
+def task_shard(task_id, shard_count):
+    """
+    Stable shard number of a task, used to split due-task scans across instances.
+
+    :param task_id: Task ID (document ID)
+    :param shard_count: Total number of shards
+    :return: Shard index in [0, shard_count)
+    """
+    return zlib.crc32(task_id.encode('utf-8')) % shard_count
+
+def iter_notify_task_pages(start, end, page_size=200, shard_index=0, shard_count=1, fields=None):
+    """
+    Stream unnotified tasks whose notifyDate is within [start, end], ordered by
+    notifyDate, one cursor-paginated page at a time.
+
+    Sharding is applied to each page after it is read, so it only splits the
+    claims and pushes between instances; every instance still reads the whole
+    due range. The shard is derived from the task ID rather than stored, which
+    keeps shard_count free to change between deployments.
 
-    return docs
+    :param start: Lower bound (inclusive), or None for no lower bound
+    :param end: Upper bound (inclusive)
+    :param page_size: Number of tasks fetched per round trip
+    :param shard_index: Only yield tasks belonging to this shard (filtered after the read)
+    :param shard_count: Total number of shards; 1 disables sharding
+    :param fields: Document fields to fetch, or None for all
+    :return: Generator of non-empty lists of Tasks
+    """
+    for page in get_task_storage().iter_notify_range(start, end, page_size, fields):
+        if shard_count > 1:
+            page = [task for task in page if task_shard(task.id, shard_count) == shard_index]
+        if page:
+            yield page
+
+def claim_task(task_id, owner, lease_seconds, due_by):
+    """
+    Take the notification lease on a task so no other instance notifies it
+    until the lease expires.
+
+    :param task_id: Task ID (document ID)
+    :param owner: Lease token, unique per notification run
+    :param lease_seconds: Lease duration
+    :param due_by: Upper bound of the scan the task came from; a task whose stored
+                   notifyDate is now later is not claimed
+    :return: True if this run now holds the lease
+    """
+    now = datetime.now(timezone.utc)
+    lease_until = now + timedelta(seconds=lease_seconds)
+    claimed = get_task_storage().claim(task_id, owner, lease_until, now, due_by)
+    if claimed:
+        task_cache.merge(task_id, {"leaseOwner": owner, "leaseExpiresAt": lease_until})
+    return claimed
@@ -0,0 +1,228 @@
+"""
+Storage interface for Task documents.
+
+task_operations talks to a TaskStorage rather than to Firestore directly, so
+the bot can run against an in-memory or SQLite store for load tests and
+benchmarks. The backend is chosen with configure_task_storage().
+"""
+FIRESTORE_BACKEND = "firestore"
+MEMORY_BACKEND = "memory"
+SQLITE_BACKEND = "sqlite"
+
+# Fields a Task document may contain, besides its ID. leaseOwner and
+# leaseExpiresAt record which instance is currently notifying the task;
+# createdAt lets abandoned drafts be collected.
+TASK_FIELDS = ("message", "sourceId", "notifiedId", "isNotified", "expireDate", "notifyDate",
+               "leaseOwner", "leaseExpiresAt", "createdAt",
+               "deliveryAttempts", "lastDeliveryError", "deliveryDueAt")
+
+
+class TaskStorage:
+    """
+    Base class for Task storage backends.
+
+    Reads return Task records (see task_model); writes take dictionaries of
+    document fields from TASK_FIELDS. Datetimes are timezone-aware. Methods
+    that accept `fields` only fetch those document fields (a projection);
+    the other Task attributes are None. Implementations must be thread-safe.
+    """
+
+    def create(self, data, task_id=None):
+        """
+        :param data: Task fields
+        :param task_id: Create the task under this ID instead of generating one; an existing task
+                        with the ID is left untouched and the call fails
+        :return: Task ID, or None on failure (including when the ID is already taken)
+        """
+        raise NotImplementedError
+
+    def get(self, task_id, fields=None):
+        """
+        :param fields: Document fields to fetch, or None for all
+        :return: Task, or None if not found
+        """
+        raise NotImplementedError
+
+    def get_many(self, task_ids, fields=None):
+        """
+        :param task_ids: Task IDs
+        :param fields: Document fields to fetch, or None for all
+        :return: List of Tasks in the order of `task_ids`, None for missing ones
+        """
+        return [self.get(task_id, fields) for task_id in task_ids]
+
+    def update(self, task_id, updates):
+        """
+        :return: True if successful, False otherwise
+        """
+        raise NotImplementedError
+
+    def update_many(self, task_ids, updates):
+        """
+        Apply the same updates to many tasks.
+
+        :return: Dictionary with 'updated' (list of IDs) and 'failed' (ID -> error message)
+        """
+        updated, failed = [], {}
+        for task_id in task_ids:
+            if self.update(task_id, updates):
+                updated.append(task_id)
+            else:
+                failed[task_id] = "update failed"
+        return {"updated": updated, "failed": failed}
+
+    def delete(self, task_id):
+        """
+        :return: True if successful, False otherwise
+        """
+        raise NotImplementedError
+
+    def delete_many(self, task_ids):
+        """
+        :return: Dictionary with 'deleted' (list of IDs) and 'failed' (ID -> error message)
+        """
+        deleted, failed = [], {}
+        for task_id in task_ids:
+            if self.delete(task_id):
+                deleted.append(task_id)
+            else:
+                failed[task_id] = "delete failed"
+        return {"deleted": deleted, "failed": failed}
+
+    def archive_many(self, tasks, reason=None):
+        """
+        Move tasks out of the Task store into the TaskArchive store.
+
+        :param tasks: Complete Tasks (not projected), since their fields are copied
+        :param reason: Recorded as archiveReason, e.g. "deadLetter" for undeliverable tasks
+        :return: Dictionary with 'archived' (list of IDs) and 'failed' (ID -> error message)
+        """
+        raise NotImplementedError
+
+    def iter_stale_pages(self, expired_before, created_before, page_size):
+        """
+        Tasks that no longer need to be kept, page by page:
+        notified tasks whose expireDate is before `expired_before`, and drafts
+        (no expireDate) created before `created_before`. Drafts written before
+        createdAt existed count as stale.
+
+        Pages are fetched with cursors, so deleting the tasks of a page while
+        iterating is safe.
+
+        :return: Generator of lists of complete Tasks
+        """
+        raise NotImplementedError
+
+    def query(self, field, operator, value, fields=None):
+        """
+        :param field: Field to query
+        :param operator: One of '==', '!=', '<', '<=', '>', '>='
+        :param value: Value to compare
+        :param fields: Document fields to fetch, or None for all
+        :return: List of matching Tasks
+        """
+        raise NotImplementedError
+
+    def query_notify_range(self, start, end, fields=None):
+        """
+        Unnotified tasks whose notifyDate falls within [start, end].
+
+        :param start: Lower bound (inclusive), or None for no lower bound
+        :param end: Upper bound (inclusive)
+        :param fields: Document fields to fetch, or None for all
+        :return: List of Tasks
+        """
+        raise NotImplementedError
+
+    def iter_notify_range(self, start, end, page_size, fields=None):
+        """
+        Like query_notify_range, but ordered by notifyDate and fetched page by page.
+
+        :param page_size: Maximum number of tasks per page
+        :param fields: Document fields to fetch, or None for all
+        :return: Generator of lists of Tasks
+        """
+        raise NotImplementedError
+
+    def query_pending_for_chat(self, notified_id, limit, after=None, fields=None):
+        """
+        Unnotified tasks of one chat that have a notifyDate, ordered by
+        (notifyDate, id). Served by the (notifiedId, isNotified, notifyDate) index.
+
+        :param notified_id: Chat the tasks notify
+        :param limit: Maximum number of tasks
+        :param after: (notifyDate, task ID) cursor of the last task already seen, or None
+        :param fields: Document fields to fetch, or None for all
+        :return: List of Tasks
+        """
+        raise NotImplementedError
+
+    def query_delivery_backlog(self, fields=None):
+        """
+        Unnotified tasks with at least one failed notification push. Served by
+        the (isNotified, deliveryAttempts) index.
+
+        :param fields: Document fields to fetch, or None for all
+        :return: List of Tasks
+        """
+        raise NotImplementedError
+
+    def claim(self, task_id, owner, lease_until, now, due_by):
+        """
+        Atomically take the notification lease on an unnotified task that is due.
+
+        The claim succeeds only if nobody holds the lease or it has expired;
+        a live lease is never re-entered, not even by the same owner, so
+        `owner` must be unique per notification run. The stored notifyDate is
+        re-checked against `due_by`, so a task whose notifyDate moved later
+        after it was scanned (a delivery retry, or the user picking a later
+        time) is not claimed from a stale scan page or index entry.
+
+        :param task_id: Task ID
+        :param owner: Lease token of the claiming run
+        :param lease_until: When the new lease expires
+        :param now: Current time, used to decide whether an existing lease has expired
+        :param due_by: Upper bound of the scan the task came from; its notifyDate must not be later
+        :return: True if `owner` now holds the lease
+        """
+        raise NotImplementedError
+
+
+def can_claim(data, owner, now, due_by):
+    """Whether `owner` may take the notification lease on a task with the given fields."""
+    if data.get("isNotified"):
+        return False
+    notify_date = data.get("notifyDate")
+    if notify_date is None or notify_date > due_by:
+        return False
+    lease_owner, lease_expires_at = data.get("leaseOwner"), data.get("leaseExpiresAt")
+    return lease_owner is None or lease_expires_at is None or lease_expires_at <= now
+
+
+_storage = None
+
+def configure_task_storage(backend, sqlite_path=None):
+    """
+    Select the storage backend used by task_operations.
+
+    :param backend: 'firestore', 'memory' or 'sqlite'
+    :param sqlite_path: Database file for the SQLite backend
+    :return: The configured TaskStorage
+    """
+    global _storage
+    if backend == FIRESTORE_BACKEND:
+        from .firestore_task_storage import FirestoreTaskStorage
+        _storage = FirestoreTaskStorage()
+    elif backend == MEMORY_BACKEND:
+        from .memory_task_storage import MemoryTaskStorage
+        _storage = MemoryTaskStorage()
+    elif backend == SQLITE_BACKEND:
+        from .sqlite_task_storage import SQLiteTaskStorage
+        _storage = SQLiteTaskStorage(sqlite_path)
+    else:
+        raise ValueError(f"Unknown task storage backend: {backend}")
+    return _storage
+
+def get_task_storage() -> TaskStorage:
+    """Return the configured storage, defaulting to Firestore."""
+    return _storage or configure_task_storage(FIRESTORE_BACKEND)
@@ -0,0 +1,34 @@
+"""
+gunicorn configuration, driven by utils.config.Settings:
+
+    gunicorn wsgi:app
+
+Workers use threads (gthread): request handling is dominated by Firestore
+and LINE API round trips, so a few processes with several threads each keep
+memory low while overlapping the network waits.
+"""
+import multiprocessing
+
+from utils.config import get_settings
+
+_settings = get_settings()
+
+bind = f"0.0.0.0:{_settings.port}"
+worker_class = "gthread"
+workers = _settings.server_workers or multiprocessing.cpu_count()
+threads = _settings.server_threads
+preload_app = _settings.server_preload_app
+timeout = _settings.server_timeout_seconds
+graceful_timeout = _settings.server_graceful_timeout_seconds
+keepalive = _settings.server_keepalive_seconds
+max_requests = _settings.server_max_requests
+max_requests_jitter = _settings.server_max_requests // 10
+
+
+def post_worker_init(worker):
+    import wsgi
+    wsgi.init_worker()
+
+def worker_exit(server, worker):
+    import wsgi
+    wsgi.shutdown_worker()
@@ -0,0 +1,89 @@
+"""
+Per-chat display timezones.
+
+Each group, room or 1:1 chat can pick its own timezone with
+`@YangBot 時區 <name>`; chats without one use the default timezone. Lookups
+are cached in a bounded TTL/LRU map because every rendered reminder needs
+its chat's timezone. The optional Firestore store keeps the choice across
+restarts and instances; with the memory backend a choice lasts only as long
+as its cache entry.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from database.chat_setting_operations import (get_chat_timezone_name,
+                                              set_chat_timezone_name)
+from utils import timer
+
+MEMORY_BACKEND = "memory"
+FIRESTORE_BACKEND = "firestore"
+
+
+class ChatTimezones:
+    def __init__(self, backend=MEMORY_BACKEND, ttl_seconds=600, max_size=10000):
+        if backend not in (MEMORY_BACKEND, FIRESTORE_BACKEND):
+            raise ValueError(f"Unknown chat timezone backend: {backend}")
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        # chat ID -> (expires at, timezone name or None), least recently used first
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id):
+        """
+        :param chat_id: Chat key from get_chat_id, or None
+        :return: The chat's ZoneInfo, or the default timezone
+        """
+        if not chat_id:
+            return timer.default_timezone
+
+        with self._lock:
+            entry = self._names.get(chat_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._names[chat_id]
+                entry = None
+            elif entry is not None:
+                self._names.move_to_end(chat_id)
+        if entry is None:
+            name = get_chat_timezone_name(chat_id) if self.backend == FIRESTORE_BACKEND else None
+            entry = self._put(chat_id, name)
+
+        name = entry[1]
+        return timer.get_timezone(name) if name else timer.default_timezone
+
+    def _put(self, chat_id, name):
+        entry = (time.monotonic() + self.ttl_seconds, name)
+        with self._lock:
+            self._names[chat_id] = entry
+            self._names.move_to_end(chat_id)
+            while len(self._names) > self.max_size:
+                self._names.popitem(last=False)
+        return entry
+
+    def set(self, chat_id, name):
+        """
+        Set a chat's timezone.
+
+        :raises ValueError: If the name is not a known timezone
+        :return: True if the setting was stored
+        """
+        timer.get_timezone(name)
+        if self.backend == FIRESTORE_BACKEND and not set_chat_timezone_name(chat_id, name):
+            return False
+        self._put(chat_id, name)
+        return True
+
+
+_chat_timezones = ChatTimezones()
+
+def configure_chat_timezones(backend, ttl_seconds, max_size=10000):
+    global _chat_timezones
+    _chat_timezones = ChatTimezones(backend=backend, ttl_seconds=ttl_seconds, max_size=max_size)
+
+def get_chat_timezone(chat_id):
+    return _chat_timezones.get(chat_id)
+
+def set_chat_timezone(chat_id, name):
+    return _chat_timezones.set(chat_id, name)
@@ -0,0 +1,108 @@
+"""
+Idempotency for LINE webhook redeliveries.
+
+Events are keyed on their webhookEventId. A bounded, time-expiring in-memory
+seen-set catches redeliveries to the same instance; the optional Firestore
+store shares the seen-set across instances. An event is recorded before its
+handler runs, so concurrent redeliveries are skipped; if the handler fails,
+the event is forgotten again so LINE's redelivery of it is not dropped.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from database.event_operations import claim_event, release_event
+
+MEMORY_BACKEND = "memory"
+FIRESTORE_BACKEND = "firestore"
+
+
+class SeenEventSet:
+    def __init__(self, max_size=10000, ttl_seconds=600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, event_id):
+        """
+        Record an event ID.
+
+        :return: True if the ID was new (or had expired), False if it was already seen
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Entries are in insertion order, so expired ones are at the front
+            while self._seen and next(iter(self._seen.values())) < now:
+                self._seen.popitem(last=False)
+
+            if event_id in self._seen:
+                return False
+
+            self._seen[event_id] = now + self.ttl_seconds
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return True
+
+    def discard(self, event_id):
+        with self._lock:
+            self._seen.pop(event_id, None)
+
+
+class EventDeduplicator:
+    def __init__(self, backend=MEMORY_BACKEND, max_size=10000, ttl_seconds=600):
+        if backend not in (MEMORY_BACKEND, FIRESTORE_BACKEND):
+            raise ValueError(f"Unknown event dedup backend: {backend}")
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.seen = SeenEventSet(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.duplicates = 0
+
+    def is_duplicate(self, event):
+        """
+        Check an event against the seen-set, recording it if new.
+
+        :param event: Webhook event object
+        :return: True if the event was already processed and should be skipped
+        """
+        event_id = getattr(event, 'webhook_event_id', None)
+        if not event_id:
+            return False
+
+        duplicate = not self.seen.add(event_id)
+        if not duplicate and self.backend == FIRESTORE_BACKEND:
+            duplicate = not claim_event(event_id, self.ttl_seconds)
+
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+    def forget(self, event):
+        """
+        Undo is_duplicate for an event whose handler failed, so its redelivery is handled.
+
+        :param event: Webhook event object
+        """
+        event_id = getattr(event, 'webhook_event_id', None)
+        if not event_id:
+            return
+
+        self.seen.discard(event_id)
+        if self.backend == FIRESTORE_BACKEND:
+            release_event(event_id)
+
+
+_deduplicator = EventDeduplicator()
+
+def configure_event_dedup(backend, max_size, ttl_seconds):
+    global _deduplicator
+    _deduplicator = EventDeduplicator(backend=backend, max_size=max_size, ttl_seconds=ttl_seconds)
+
+def is_duplicate_event(event):
+    return _deduplicator.is_duplicate(event)
+
+def forget_event(event):
+    _deduplicator.forget(event)
+
+def get_duplicate_count():
+    return _deduplicator.duplicates
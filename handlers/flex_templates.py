@@ -0,0 +1,129 @@
+"""
+Flex message templates.
+
+Templates are JSON files in this directory, parsed and validated once and
+kept in memory. Each template declares named slots (paths into the JSON) that
+are resolved when the template is loaded. Rendering copies only the
+containers along those slot paths and shares everything else with the cached
+template, so it stays cheap even in notification bursts.
+"""
+import json
+import logging
+import os
+import threading
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TASK_TEMPLATE = "task"
+
+logger = logging.getLogger(__name__)
+
+# Slot name -> path into the template JSON
+TASK_TEMPLATE_SLOTS = {
+    "title": ("body", "contents", 0, "text"),
+    "message": ("body", "contents", 1, "text"),
+    "notify_date": ("body", "contents", 2, "text"),
+    "expire_date": ("body", "contents", 3, "text"),
+    "task_id": ("body", "contents", 5, "contents", 1, "text"),
+}
+
+
+class FlexTemplate:
+    def __init__(self, name, path, slots):
+        self.name = name
+        self.path = path
+        self.slots = slots
+        self.mtime = None
+        self.content = None
+        self.defaults = {}
+        self.load()
+
+    def load(self):
+        """Parse the template file and check that every slot path exists."""
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+
+        defaults = {}
+        for slot, path in self.slots.items():
+            node = content
+            try:
+                for key in path:
+                    node = node[key]
+            except (KeyError, IndexError, TypeError):
+                raise ValueError(f"Flex template '{self.name}' has no slot '{slot}' at {path}")
+            defaults[slot] = node
+
+        self.content, self.defaults, self.mtime = content, defaults, mtime
+
+    def is_stale(self):
+        try:
+            return os.path.getmtime(self.path) != self.mtime
+        except OSError:
+            return False
+
+    def render(self, **values):
+        """
+        Return a new template dictionary with the given slots filled in.
+
+        Only containers on the paths of the filled slots are copied; the rest
+        is shared with the cached template and must not be mutated.
+        """
+        root = dict(self.content)
+        copied = {(): root}
+        for slot, value in values.items():
+            path = self.slots[slot]
+            parent = root
+            for depth in range(1, len(path)):
+                prefix = path[:depth]
+                node = copied.get(prefix)
+                if node is None:
+                    node = parent[path[depth - 1]]
+                    node = list(node) if isinstance(node, list) else dict(node)
+                    parent[path[depth - 1]] = node
+                    copied[prefix] = node
+                parent = node
+            parent[path[-1]] = value
+        return root
+
+
+class FlexTemplateRegistry:
+    def __init__(self, hot_reload=False):
+        self.hot_reload = hot_reload
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, filename, slots):
+        template = FlexTemplate(name, os.path.join(TEMPLATE_DIR, filename), slots)
+        with self._lock:
+            self._templates[name] = template
+        return template
+
+    def get(self, name) -> FlexTemplate:
+        template = self._templates[name]
+        if self.hot_reload and template.is_stale():
+            with self._lock:
+                if template.is_stale():
+                    try:
+                        template.load()
+                    except Exception as e:
+                        logger.error("Error reloading flex template '%s', keeping previous version: %s", name, e)
+        return template
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def load_flex_templates(hot_reload=False) -> FlexTemplateRegistry:
+    """Load and validate every flex template. Safe to call more than once."""
+    global _registry
+    with _registry_lock:
+        registry = FlexTemplateRegistry(hot_reload=hot_reload)
+        registry.register(TASK_TEMPLATE, "task_created_flex_template.json", TASK_TEMPLATE_SLOTS)
+        _registry = registry
+    return registry
+
+def get_flex_template(name) -> FlexTemplate:
+    """Return a loaded template by name, loading all templates on first use."""
+    registry = _registry or load_flex_templates()
+    return registry.get(name)
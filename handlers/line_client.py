@@ -0,0 +1,67 @@
+"""
+Process-wide LINE Messaging API client.
+
+A single ApiClient (and so a single urllib3 connection pool) is kept per
+Configuration, so outbound replies and pushes reuse keep-alive connections
+instead of paying a new TLS handshake for every message.
+"""
+import atexit
+import threading
+
+from linebot.v3.messaging import ApiClient, Configuration, MessagingApi
+
+_lock = threading.Lock()
+_clients: dict[int, tuple[ApiClient, MessagingApi]] = {}
+_request_timeout: tuple[float, float] | None = None
+
+
+def configure_messaging_client(line_bot_configuration: Configuration, pool_size: int, connect_timeout: float, read_timeout: float):
+    """
+    Apply connection pool and timeout settings used by every outbound request.
+
+    Must be called before the first message is sent, since the pool size is
+    fixed when the underlying ApiClient is created.
+
+    :param line_bot_configuration: LINE bot configuration
+    :param pool_size: Maximum number of pooled keep-alive connections
+    :param connect_timeout: Connect timeout in seconds
+    :param read_timeout: Read timeout in seconds
+    """
+    global _request_timeout
+    line_bot_configuration.connection_pool_maxsize = pool_size
+    _request_timeout = (connect_timeout, read_timeout)
+
+def get_request_timeout():
+    """Return the (connect, read) timeout passed to every API call, or None for the SDK default."""
+    return _request_timeout
+
+def get_messaging_api(line_bot_configuration: Configuration) -> MessagingApi:
+    """
+    Return the shared MessagingApi for the given configuration, creating it on first use.
+
+    :param line_bot_configuration: LINE bot configuration
+    :return: Thread-safe MessagingApi backed by a pooled ApiClient
+    """
+    key = id(line_bot_configuration)
+    entry = _clients.get(key)
+    if entry is None:
+        with _lock:
+            entry = _clients.get(key)
+            if entry is None:
+                api_client = ApiClient(configuration=line_bot_configuration)
+                entry = (api_client, MessagingApi(api_client))
+                _clients[key] = entry
+
+    return entry[1]
+
+def close_messaging_clients():
+    """Close every pooled client and release its connections."""
+    with _lock:
+        entries = list(_clients.values())
+        _clients.clear()
+
+    for api_client, _ in entries:
+        api_client.close()
+        api_client.rest_client.pool_manager.clear()
+
+atexit.register(close_messaging_clients)
@@ -1,13 +1,49 @@
-import json
+from datetime import datetime, timedelta, timezone
 
-from linebot.v3.messaging import (ApiClient, ButtonsTemplate, Configuration,
+from linebot.v3.messaging import (ButtonsTemplate, Configuration,
                                   DatetimePickerAction, FlexContainer,
-                                  FlexMessage, Message, MessagingApi,
-                                  PushMessageRequest, ReplyMessageRequest,
-                                  TemplateMessage, TextMessage)
+                                  FlexMessage, Message, PushMessageRequest,
+                                  ReplyMessageRequest, TemplateMessage,
+                                  TextMessage)
+from linebot.v3.messaging.exceptions import ApiException
 
-from database.task_operations import create_task
-from utils.timer import get_line_datetime_string_format, to_local_datetime
+from database.task_operations import create_task, get_pending_tasks_for_chat
+from handlers.chat_timezones import get_chat_timezone, set_chat_timezone
+from handlers.flex_templates import TASK_TEMPLATE, get_flex_template
+from handlers.line_client import get_messaging_api, get_request_timeout
+from handlers.reminder_drafts import encode_reminder_draft
+from utils.metrics import Counter, Histogram, timed
+from utils.timer import format_local_minute, get_line_datetime_string_format
+
+FLEX_RENDER_SECONDS = Histogram(
+    "yangbot_flex_render_seconds",
+    "Time spent rendering a flex template into a FlexMessage",
+    ["template"],
+)
+LINE_API_SECONDS = Histogram(
+    "yangbot_line_api_seconds",
+    "Time spent in LINE Messaging API calls",
+    ["method"],
+)
+# LINE accepts at most 5 messages per push/reply and 12 bubbles per carousel
+MAX_MESSAGES_PER_REQUEST = 5
+MAX_CAROUSEL_BUBBLES = 12
+
+# LINE limit on the length of postback data
+MAX_POSTBACK_DATA_LENGTH = 300
+
+# Tasks per page of "@YangBot 列表", leaving room in the carousel for the next-page bubble
+TASK_LIST_PAGE_SIZE = MAX_CAROUSEL_BUBBLES - 2
+LIST_TASKS_ACTION = "listTasks"
+CANCEL_TASK_ACTION = "cancel"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+LINE_API_ERRORS = Counter(
+    "yangbot_line_api_errors_total",
+    "LINE Messaging API calls that failed, by HTTP status",
+    ["method", "status"],
+)
 
 
 def handle_tag_bot_message(event, split_text, line_bot_configuration, app):
@@ -19,10 +55,64 @@ def handle_tag_bot_message(event, split_text, line_bot_configuration, app):
         message = ' '.join(split_text[2:])
         user_id = event.source.user_id
         room_id = get_group_or_room_id(event.source)
-        task_id = create_task(message, user_id, room_id, False, None)
-        expire_datetime_picker_message = build_expire_datetime_picker_message(event.timestamp, task_id)
+        postback_data = f"draft={encode_reminder_draft(message, user_id, room_id)}&action=expireDate"
+        if len(postback_data) > MAX_POSTBACK_DATA_LENGTH:
+            # Too long to carry in the picker, so store it as a draft task as before
+            postback_data = f"taskId={create_task(message, user_id, room_id, False, None)}&action=expireDate"
+        expire_datetime_picker_message = build_expire_datetime_picker_message(
+            event.timestamp, postback_data, get_chat_timezone(get_chat_id(event.source))
+        )
         return reply_message(line_bot_configuration, event.reply_token, [expire_datetime_picker_message])
 
+    # Handle "列表" command, Ex. @botname 列表
+    if split_text[1] == "列表":
+        return reply_task_list(event, None, line_bot_configuration, app)
+
+    # Handle "時區" command, Ex. @botname 時區 Asia/Tokyo
+    if split_text[1] == "時區":
+        return handle_timezone_command(event, split_text[2:], line_bot_configuration, app)
+
+def handle_timezone_command(event, args, line_bot_configuration, app):
+    chat_id = get_chat_id(event.source)
+    if not args:
+        reply_text = f"目前的時區：{get_chat_timezone(chat_id).key}"
+    else:
+        try:
+            if set_chat_timezone(chat_id, args[0]):
+                reply_text = f"時區已設定為 {args[0]}"
+            else:
+                reply_text = "時區設定失敗，請稍後再試。"
+        except ValueError:
+            reply_text = f"無法識別的時區：{args[0]}，請使用如 Asia/Taipei 的格式。"
+
+    return reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
+
+def reply_task_list(event, after, line_bot_configuration, app):
+    """
+    Reply with one page of the chat's pending tasks.
+
+    :param after: Cursor of the previous page, or None for the first page
+    """
+    chat_id = get_group_or_room_id(event.source)
+    if chat_id is None:
+        return reply_message(line_bot_configuration, event.reply_token, [TextMessage(text="請在群組或聊天室中使用列表指令。")])
+
+    tasks, next_cursor = get_pending_tasks_for_chat(chat_id, TASK_LIST_PAGE_SIZE, after)
+    if not tasks:
+        reply_text = "目前沒有待提醒的任務。" if after is None else "沒有更多待提醒的任務了。"
+        return reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
+
+    return reply_message(line_bot_configuration, event.reply_token, [build_task_list_message(tasks, next_cursor)])
+
+def encode_task_cursor(cursor):
+    """Encode a (notifyDate, task ID) cursor for postback data, exact to the microsecond."""
+    notify_date, task_id = cursor
+    return f"{(notify_date - _EPOCH) // timedelta(microseconds=1)}:{task_id}"
+
+def decode_task_cursor(value):
+    microseconds, task_id = value.split(":", 1)
+    return _EPOCH + timedelta(microseconds=int(microseconds)), task_id
+
 def get_group_or_room_id(source):
     if source.type == "group":
         return source.group_id
@@ -30,20 +120,37 @@ def get_group_or_room_id(source):
         return source.room_id
     return None
 
+def get_chat_id(source):
+    """
+    Key for per-chat settings such as the timezone: the group or room ID, or
+    the user ID in a 1:1 chat. Use it for both reads and writes of a setting.
+    """
+    return get_group_or_room_id(source) or source.user_id
+
+def get_task_chat_id(task):
+    """Key from get_chat_id for the chat a task was created in; 1:1 tasks have no notifiedId."""
+    return task.notified_id or task.source_id
+
 def reply_introduction_message(event, line_bot_configuration, app):
     introduction_text = (
         "你好！我是家庭小幫手 YangBot 🤖。\n"
         "你可以在群組或聊天室中標註我，並使用以下指令來設定提醒：\n"
         "@YangBot 提醒 <你的提醒事項>\n"
         "例如：@YangBot 提醒 買牛奶\n"
-        "我會幫你設定一個提醒，並讓你選擇提醒的日期和時間。"
+        "我會幫你設定一個提醒，並讓你選擇提醒的日期和時間。\n"
+        "@YangBot 列表 可以查看這個聊天室待提醒的任務，並取消不需要的提醒。\n"
+        "@YangBot 時區 <時區名稱> 可以設定這個聊天室的時區，例如：@YangBot 時區 Asia/Tokyo"
     )
 
     return reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=introduction_text)])
 
-def build_expire_datetime_picker_message(timestamp: float, task_id: str) -> TemplateMessage:
-    current_time = get_line_datetime_string_format(timestamp)
-    datetime_picker_action = DatetimePickerAction(label="選擇日期和時間", data=f"taskId={task_id}&action=expireDate", mode="datetime", initial=current_time, min=current_time)
+def build_expire_datetime_picker_message(timestamp: float, postback_data: str, tz=None) -> TemplateMessage:
+    """
+    :param postback_data: "draft=<token>&action=expireDate" for a reminder not written yet,
+                          or "taskId=<id>&action=expireDate" for an existing task
+    """
+    current_time = get_line_datetime_string_format(timestamp, tz)
+    datetime_picker_action = DatetimePickerAction(label="選擇日期和時間", data=postback_data, mode="datetime", initial=current_time, min=current_time)
 
     template_message = TemplateMessage(
         alt_text="設定到期日",
@@ -56,8 +163,8 @@ def build_expire_datetime_picker_message(timestamp: float, task_id: str) -> Temp
 
     return template_message
 
-def build_notify_datetime_picker_message(timestamp: float, expire_date: str, task_id: str) -> TemplateMessage:
-    current_time = get_line_datetime_string_format(timestamp)
+def build_notify_datetime_picker_message(timestamp: float, expire_date: str, task_id: str, tz=None) -> TemplateMessage:
+    current_time = get_line_datetime_string_format(timestamp, tz)
     datetime_picker_action = DatetimePickerAction(label="選擇日期和時間", data=f"taskId={task_id}&action=notifyDate", mode="datetime", initial=current_time, min=current_time, max=expire_date)
 
     template_message = TemplateMessage(
@@ -72,59 +179,141 @@ def build_notify_datetime_picker_message(timestamp: float, expire_date: str, tas
     return template_message
 
 def build_task_created_message(task):
-    flex_message_content = get_flex_message_content_template(task)
-    flex_message_content["body"]["contents"][0]["text"] = '任務建立成功'
-    return FlexMessage(
-        alt_text="任務建立成功",
-        contents = FlexContainer.from_dict(flex_message_content)
-    )
+    return build_task_flex_message(task, '任務建立成功', "任務建立成功")
 
 def build_task_updated_message(task):
-    flex_message_content = get_flex_message_content_template(task)
-    flex_message_content["body"]["contents"][0]["text"] = '任務更新成功'
-    return FlexMessage(
-        alt_text="任務更新成功",
-        contents = FlexContainer.from_dict(flex_message_content)
-    )
+    return build_task_flex_message(task, '任務更新成功', "任務更新成功")
 
 def build_notification_message(task):
-    flex_message_content = get_flex_message_content_template(task)
-    flex_message_content["body"]["contents"][0]["text"] = '提醒'
-    return FlexMessage(
-        alt_text="任務即將到期通知",
-        contents = FlexContainer.from_dict(flex_message_content)
-    )
+    return build_task_flex_message(task, '提醒', "任務即將到期通知")
+
+def build_notification_messages(tasks):
+    """
+    Build the messages for one push notifying several tasks of the same chat.
+
+    Up to MAX_MESSAGES_PER_REQUEST tasks get one flex message each; larger
+    groups are packed into carousels of up to MAX_CAROUSEL_BUBBLES bubbles.
+
+    :param tasks: Tasks sharing the same notifiedId, at most MAX_MESSAGES_PER_REQUEST * MAX_CAROUSEL_BUBBLES
+    :return: List of at most MAX_MESSAGES_PER_REQUEST messages
+    """
+    if len(tasks) <= MAX_MESSAGES_PER_REQUEST:
+        return [build_notification_message(task) for task in tasks]
+
+    messages = []
+    for offset in range(0, len(tasks), MAX_CAROUSEL_BUBBLES):
+        chunk = tasks[offset:offset + MAX_CAROUSEL_BUBBLES]
+        with timed(FLEX_RENDER_SECONDS, template=TASK_TEMPLATE):
+            bubbles = [get_flex_message_content_template(task, '提醒') for task in chunk]
+            messages.append(FlexMessage(
+                alt_text=f"{len(chunk)} 個任務即將到期通知",
+                contents=FlexContainer.from_dict({"type": "carousel", "contents": bubbles})
+            ))
+    return messages
+
+def build_task_list_message(tasks, next_cursor):
+    """
+    Build a carousel with one bubble per task, each with a cancel button, and a
+    trailing next-page bubble when more tasks follow.
 
-def get_flex_message_content_template(task):
-    with open('handlers/task_created_flex_template.json', 'r', encoding='utf-8') as f:
-        flex_message_content = json.load(f)
-        flex_message_content["body"]["contents"][1]["text"] = task['message']
-        flex_message_content["body"]["contents"][2]["text"] = f"{flex_message_content['body']['contents'][2]['text']}: {to_local_datetime(task['notifyDate']).strftime('%Y-%m-%d %H:%M')}" if task['notifyDate'] else "未設定"
-        flex_message_content["body"]["contents"][3]["text"] = f"{flex_message_content['body']['contents'][3]['text']}: {to_local_datetime(task['expireDate']).strftime('%Y-%m-%d %H:%M')}" if task['expireDate'] else "未設定"
-        flex_message_content["body"]["contents"][5]["contents"][1]["text"] = task['id']
+    :param tasks: At most TASK_LIST_PAGE_SIZE tasks
+    :param next_cursor: Cursor for the next page, or None
+    """
+    with timed(FLEX_RENDER_SECONDS, template=TASK_TEMPLATE):
+        bubbles = []
+        for task in tasks:
+            bubble = get_flex_message_content_template(task, '待提醒任務')
+            bubble["footer"] = {
+                "type": "box",
+                "layout": "vertical",
+                "contents": [{
+                    "type": "button",
+                    "style": "secondary",
+                    "height": "sm",
+                    "action": {
+                        "type": "postback",
+                        "label": "取消提醒",
+                        "data": f"taskId={task.id}&action={CANCEL_TASK_ACTION}",
+                    },
+                }],
+            }
+            bubbles.append(bubble)
 
-    return flex_message_content
+        if next_cursor is not None:
+            bubbles.append({
+                "type": "bubble",
+                "size": "micro",
+                "body": {
+                    "type": "box",
+                    "layout": "vertical",
+                    "justifyContent": "center",
+                    "contents": [{
+                        "type": "button",
+                        "action": {
+                            "type": "postback",
+                            "label": "下一頁",
+                            "data": f"action={LIST_TASKS_ACTION}&after={encode_task_cursor(next_cursor)}",
+                        },
+                    }],
+                },
+            })
+
+        return FlexMessage(
+            alt_text=f"待提醒任務（{len(tasks)} 筆）",
+            contents=FlexContainer.from_dict({"type": "carousel", "contents": bubbles})
+        )
+
+def build_task_flex_message(task, title, alt_text):
+    with timed(FLEX_RENDER_SECONDS, template=TASK_TEMPLATE):
+        flex_message_content = get_flex_message_content_template(task, title)
+        return FlexMessage(
+            alt_text=alt_text,
+            contents = FlexContainer.from_dict(flex_message_content)
+        )
+
+def get_flex_message_content_template(task, title):
+    template = get_flex_template(TASK_TEMPLATE)
+    tz = get_chat_timezone(get_task_chat_id(task))
+    # A retried notification shows the time the user picked, not the retry time
+    notify_date = task.delivery_due_at or task.notify_date
+    return template.render(
+        title=title,
+        message=task.message,
+        notify_date=f"{template.defaults['notify_date']}: {format_local_minute(notify_date, tz)}" if notify_date else "未設定",
+        expire_date=f"{template.defaults['expire_date']}: {format_local_minute(task.expire_date, tz)}" if task.expire_date else "未設定",
+        task_id=task.id,
+    )
 
 def reply_message(line_bot_configuration: Configuration, reply_token: str, messages: list[Message]):
-    with ApiClient(configuration=line_bot_configuration) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        line_bot_api.reply_message_with_http_info(
-            ReplyMessageRequest(
-                reply_token=reply_token,
-                messages=messages
+    line_bot_api = get_messaging_api(line_bot_configuration)
+    with timed(LINE_API_SECONDS, method="reply"):
+        try:
+            line_bot_api.reply_message_with_http_info(
+                ReplyMessageRequest(
+                    reply_token=reply_token,
+                    messages=messages
+                ),
+                _request_timeout=get_request_timeout()
             )
-        )
+        except ApiException as e:
+            LINE_API_ERRORS.inc(method="reply", status=e.status)
+            raise
 
     return 'OK'
 
 def push_message(line_bot_configuration: Configuration, to: str, messages: list[Message]):
-    with ApiClient(configuration=line_bot_configuration) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        line_bot_api.push_message_with_http_info(
-            PushMessageRequest(
-                to=to,
-                messages=messages
+    line_bot_api = get_messaging_api(line_bot_configuration)
+    with timed(LINE_API_SECONDS, method="push"):
+        try:
+            line_bot_api.push_message_with_http_info(
+                PushMessageRequest(
+                    to=to,
+                    messages=messages
+                ),
+                _request_timeout=get_request_timeout()
             )
-        )
+        except ApiException as e:
+            LINE_API_ERRORS.inc(method="push", status=e.status)
+            raise
 
     return 'OK'
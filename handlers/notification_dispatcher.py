@@ -0,0 +1,300 @@
+"""
+Concurrent delivery of due-task notifications.
+
+Pushes are fanned out over a bounded thread pool so one slow LINE API round
+trip no longer holds up every reminder behind it. A 429 from LINE puts the
+whole dispatcher into a shared cooldown so workers back off together instead
+of hammering the rate limit. Tasks for the same chat are combined into a
+single push, saving API calls and monthly message quota. Pushes that still
+fail are handed to the notification outbox for a later retry.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from linebot.v3.messaging import Configuration
+from linebot.v3.messaging.exceptions import ApiException
+
+from database.task_operations import (claim_task, iter_notify_task_pages,
+                                      mark_tasks_notified)
+from handlers.message_handlers import (MAX_CAROUSEL_BUBBLES,
+                                       MAX_MESSAGES_PER_REQUEST,
+                                       build_notification_message,
+                                       build_notification_messages,
+                                       push_message)
+from handlers.notification_outbox import get_notification_outbox
+
+RATE_LIMITED_STATUS = 429
+# Document fields a notification needs; sourceId and the lease fields are not fetched
+NOTIFICATION_FIELDS = ("message", "notifiedId", "expireDate", "notifyDate", "deliveryAttempts", "deliveryDueAt")
+# Recorded for failures that never got an HTTP response
+UNKNOWN_ERROR_STATUS = 0
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitCooldown:
+    """Shared cooldown that every worker waits on after LINE answers 429."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+
+    def wait(self):
+        while True:
+            with self._lock:
+                remaining = self._until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def extend(self, seconds):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+
+def get_retry_after(error: ApiException, attempt: int, base_backoff: float) -> float:
+    """
+    Return how long to back off after a rate-limited push.
+
+    Uses the Retry-After header when LINE sends one, otherwise exponential
+    backoff with jitter.
+    """
+    retry_after = error.headers.get('Retry-After') if error.headers else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return base_backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+def push_with_retries(to, messages, description, line_bot_configuration: Configuration, cooldown: RateLimitCooldown, max_retries: int, base_backoff: float):
+    """
+    Push messages to one chat, retrying on 429.
+
+    :param description: What is being pushed, for log messages
+    :return: Tuple of (error status or None when sent, number of 429 responses)
+    """
+    rate_limited = 0
+
+    for attempt in range(max_retries + 1):
+        cooldown.wait()
+        try:
+            push_message(
+                line_bot_configuration=line_bot_configuration,
+                to=to,
+                messages=messages
+            )
+            return None, rate_limited
+        except ApiException as e:
+            if e.status != RATE_LIMITED_STATUS or attempt == max_retries:
+                logger.error("Error pushing notification for %s: %s %s", description, e.status, e.reason)
+                return e.status, rate_limited
+            rate_limited += 1
+            cooldown.extend(get_retry_after(e, attempt, base_backoff))
+        except Exception as e:
+            logger.error("Error pushing notification for %s: %s", description, e)
+            return UNKNOWN_ERROR_STATUS, rate_limited
+
+    return RATE_LIMITED_STATUS, rate_limited
+
+def send_notification(task, line_bot_configuration: Configuration, cooldown: RateLimitCooldown, max_retries: int, base_backoff: float):
+    """
+    Push one task notification, retrying on 429.
+
+    :return: Tuple of (error status or None when sent, latency in seconds, number of 429 responses)
+    """
+    started = time.perf_counter()
+    error, rate_limited = push_with_retries(
+        task.notified_id, [build_notification_message(task)], f"task {task.id}",
+        line_bot_configuration, cooldown, max_retries, base_backoff
+    )
+    return error, time.perf_counter() - started, rate_limited
+
+def send_notification_batch(tasks, line_bot_configuration: Configuration, cooldown: RateLimitCooldown, max_retries: int, base_backoff: float):
+    """
+    Push the notifications of several tasks for the same chat in one request.
+
+    A push is accepted or rejected as a whole. If LINE rejects the combined
+    push itself (a 4xx other than 429), every task is retried on its own so
+    one bad task cannot hold back the rest of the group. Rate limiting, 5xx
+    responses and requests that got no response fail the whole group, which
+    the notification outbox then retries with backoff; splitting would only
+    multiply the failing requests while LINE is unavailable.
+
+    :param tasks: Tasks sharing the same notifiedId, see group_notifications
+    :return: Tuple of (list of (error status or None, latency, 429 count) per task, number of push requests made)
+    """
+    if len(tasks) == 1:
+        return [send_notification(tasks[0], line_bot_configuration, cooldown, max_retries, base_backoff)], 1
+
+    started = time.perf_counter()
+    error, rate_limited = push_with_retries(
+        tasks[0].notified_id, build_notification_messages(tasks), f"{len(tasks)} tasks to {tasks[0].notified_id}",
+        line_bot_configuration, cooldown, max_retries, base_backoff
+    )
+    latency = time.perf_counter() - started
+    if error is None or error == RATE_LIMITED_STATUS or not 400 <= error < 500:
+        return [(error, latency, rate_limited)] + [(error, latency, 0)] * (len(tasks) - 1), 1
+
+    results = [send_notification(task, line_bot_configuration, cooldown, max_retries, base_backoff) for task in tasks]
+    return results, 1 + len(tasks)
+
+def group_notifications(tasks):
+    """
+    Group tasks by notifiedId into batches that each fit in a single push.
+
+    :return: List of task lists, in the order each chat first appears
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task.notified_id, []).append(task)
+
+    batch_size = MAX_MESSAGES_PER_REQUEST * MAX_CAROUSEL_BUBBLES
+    return [
+        group[offset:offset + batch_size]
+        for group in groups.values()
+        for offset in range(0, len(group), batch_size)
+    ]
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class NotificationRun:
+    """Accumulates results and timing across every page of one notification run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0
+        self.pushes = 0
+        self.sent_ids = []
+        self.latencies = []
+        self.rate_limited = 0
+        self.mark_failed = 0
+        self.not_claimed = 0
+        # (Task, error status) of every failed push
+        self.failures = []
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def record(self, tasks, results, pushes):
+        self.total += len(tasks)
+        self.pushes += pushes
+        for task, (error, _, _) in zip(tasks, results):
+            if error is None:
+                self.sent_ids.append(task.id)
+            else:
+                self.failures.append((task, error))
+        self.latencies.extend(latency for _, latency, _ in results)
+        self.rate_limited += sum(rate_limited for _, _, rate_limited in results)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            "total": self.total,
+            "sent": len(self.sent_ids),
+            "failed": self.total - len(self.sent_ids),
+            "pushes": self.pushes,
+            "rateLimited": self.rate_limited,
+            "markFailed": self.mark_failed,
+            "notClaimed": self.not_claimed,
+            "retried": self.retried,
+            "deadLettered": self.dead_lettered,
+            "elapsedMs": round(elapsed * 1000, 1),
+            "throughputPerSec": round(len(self.sent_ids) / elapsed, 1) if elapsed > 0 else 0.0,
+            "latencyMs": {
+                "p50": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95": round(percentile(latencies, 0.95) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            },
+        }
+
+
+def dispatch_notifications(tasks, line_bot_configuration: Configuration, max_concurrency=8, max_retries=3, base_backoff=1.0, run=None, group=True):
+    """
+    Push notifications for the given tasks concurrently.
+
+    :param tasks: List of Tasks to notify
+    :param line_bot_configuration: LINE bot configuration
+    :param max_concurrency: Maximum number of pushes in flight at once
+    :param max_retries: Retries per push after a 429 response
+    :param base_backoff: Base backoff in seconds when LINE sends no Retry-After
+    :param run: NotificationRun to record into, a new one if None
+    :param group: Combine tasks for the same chat into one push, see group_notifications
+    :return: The NotificationRun
+    """
+    run = run or NotificationRun()
+    cooldown = RateLimitCooldown()
+    batches = group_notifications(tasks) if group else [[task] for task in tasks]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="notify") as executor:
+        batch_results = list(executor.map(
+            lambda batch: send_notification_batch(batch, line_bot_configuration, cooldown, max_retries, base_backoff),
+            batches
+        ))
+
+    for batch, (results, pushes) in zip(batches, batch_results):
+        run.record(batch, results, pushes)
+    return run
+
+def deliver_notifications(tasks, line_bot_configuration: Configuration, max_concurrency=8, max_retries=3, base_backoff=1.0, run=None, group=True):
+    """
+    Push notifications for the given tasks, mark the delivered ones as
+    notified and hand the failed ones to the outbox for a retry.
+
+    :return: The NotificationRun, including the number of failed write-backs
+    """
+    run = run or NotificationRun()
+    already_sent, already_failed = len(run.sent_ids), len(run.failures)
+    dispatch_notifications(tasks, line_bot_configuration, max_concurrency, max_retries, base_backoff, run, group)
+    write_back = mark_tasks_notified(run.sent_ids[already_sent:])
+    run.mark_failed += len(write_back['failed'])
+
+    failures = run.failures[already_failed:]
+    if failures:
+        retried, dead_lettered = get_notification_outbox().record_failures(failures)
+        run.retried += retried
+        run.dead_lettered += dead_lettered
+    return run
+
+def deliver_due_tasks(start, end, line_bot_configuration: Configuration, owner, lease_seconds=300,
+                      page_size=200, shard_index=0, shard_count=1,
+                      max_concurrency=8, max_retries=3, base_backoff=1.0, group=True):
+    """
+    Notify every unnotified task due within [start, end] that this instance can claim.
+
+    Due tasks are scanned page by page (optionally keeping only one shard's
+    tasks of each page, which splits the pushes but not the reads), and each
+    task is leased before it is pushed so that concurrent runs skip it. Every run leases under its own token, so two overlapping runs in the
+    same process (scheduler and /notify_check, or two request threads) cannot
+    both claim a task.
+
+    :param start: Lower bound (inclusive) for notifyDate, or None to include all overdue tasks
+    :param end: Upper bound (inclusive) for notifyDate
+    :param owner: Identifier of this instance; the lease owner is "<owner>:<run token>"
+    :param lease_seconds: How long a claimed task is reserved for this instance
+    :param page_size: Number of tasks fetched per page
+    :param shard_index: Shard handled by this instance
+    :param shard_count: Total number of shards
+    :param group: Combine tasks for the same chat into one push
+    :return: Run statistics
+    """
+    run = NotificationRun()
+    lease_owner = f"{owner}:{uuid.uuid4().hex[:12]}"
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="claim") as executor:
+        for page in iter_notify_task_pages(start, end, page_size, shard_index, shard_count, NOTIFICATION_FIELDS):
+            claimed = list(executor.map(lambda task: claim_task(task.id, lease_owner, lease_seconds, end), page))
+            tasks = [task for task, is_claimed in zip(page, claimed) if is_claimed]
+            run.not_claimed += len(page) - len(tasks)
+            if tasks:
+                deliver_notifications(tasks, line_bot_configuration, max_concurrency, max_retries, base_backoff, run, group)
+
+    return run.stats()
@@ -0,0 +1,123 @@
+"""
+Retry and dead-letter handling for notification pushes that failed.
+
+Failed deliveries are recorded on the Task itself, which acts as the
+outbox entry: the attempt count and last error are stored, the user's
+notifyDate is kept in deliveryDueAt, and notifyDate is moved forward by an
+exponential backoff with jitter. The regular due-task scan then picks the
+task up again, claimed, grouped and paged like any other reminder, so
+retries drain in bulk across instances without a separate queue.
+
+Targets that can never succeed (LINE rejecting the request itself, or
+reaching the attempt limit) are dead-lettered: moved to the archive with
+archiveReason "deadLetter" and the last error, out of every scan.
+"""
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+
+from database.task_operations import (dead_letter_tasks,
+                                      get_delivery_backlog,
+                                      reschedule_task_delivery)
+from handlers.reminder_scheduler import notify_date_changed
+from utils.metrics import Counter
+
+# Statuses LINE returns when a push to this target can never succeed (bad request, bot not in the chat, no such chat)
+PERMANENT_ERROR_STATUSES = {400, 403, 404}
+
+NOTIFICATIONS_RETRIED = Counter(
+    "yangbot_notifications_retried_total",
+    "Failed notification pushes rescheduled for another attempt",
+)
+NOTIFICATIONS_DEAD_LETTERED = Counter(
+    "yangbot_notifications_dead_lettered_total",
+    "Notifications given up on and moved to the archive",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationOutbox:
+    def __init__(self, max_attempts=8, base_backoff_seconds=60, max_backoff_seconds=3600):
+        """
+        :param max_attempts: Pushes tried per task before it is dead-lettered
+        :param base_backoff_seconds: Delay before the first retry; doubles with every attempt
+        :param max_backoff_seconds: Upper bound for the delay between attempts
+        """
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def retry_delay(self, attempts):
+        """
+        :param attempts: Failed attempts so far, at least 1
+        :return: Seconds until the next attempt, with jitter so failed groups do not retry in lockstep
+        """
+        delay = min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** (attempts - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+    def record_failures(self, failures):
+        """
+        Reschedule or dead-letter tasks whose push failed.
+
+        :param failures: List of (Task, error status) pairs; the Tasks need deliveryAttempts,
+                         deliveryDueAt and notifyDate
+        :return: Tuple of (number rescheduled, number dead-lettered)
+        """
+        now = datetime.now(timezone.utc)
+        dead = []
+        retried = 0
+
+        for task, status in failures:
+            attempts = (task.delivery_attempts or 0) + 1
+            error = f"HTTP {status}" if status else "no response"
+            if status in PERMANENT_ERROR_STATUSES or attempts >= self.max_attempts:
+                dead.append((task, error))
+                continue
+
+            next_attempt_at = now + timedelta(seconds=self.retry_delay(attempts))
+            if reschedule_task_delivery(task, error, next_attempt_at):
+                notify_date_changed(task.id, next_attempt_at)
+                retried += 1
+            else:
+                logger.error("Error rescheduling notification of task %s", task.id)
+
+        dead_lettered = 0
+        if dead:
+            result = dead_letter_tasks(dead)
+            dead_lettered = len(result["archived"])
+            for task, error in dead:
+                notify_date_changed(task.id, None)
+            logger.warning("Dead-lettered %d notifications: %s", dead_lettered,
+                           {task.id: error for task, error in dead})
+
+        NOTIFICATIONS_RETRIED.inc(retried)
+        NOTIFICATIONS_DEAD_LETTERED.inc(dead_lettered)
+        return retried, dead_lettered
+
+    def backlog(self):
+        """
+        :return: Dictionary with the number of tasks waiting for a retry, how
+                 overdue the oldest one is, and when the next retry is due
+        """
+        now = datetime.now(timezone.utc)
+        tasks = get_delivery_backlog()
+        due_dates = [task.delivery_due_at for task in tasks if task.delivery_due_at is not None]
+        next_attempts = [task.notify_date for task in tasks if task.notify_date is not None]
+        return {
+            "size": len(tasks),
+            "oldestAgeSeconds": round((now - min(due_dates)).total_seconds(), 1) if due_dates else 0.0,
+            "nextAttemptAt": min(next_attempts).isoformat() if next_attempts else None,
+            "maxAttempts": max((task.delivery_attempts for task in tasks), default=0),
+        }
+
+
+_outbox = NotificationOutbox()
+
+def configure_notification_outbox(max_attempts=8, base_backoff_seconds=60, max_backoff_seconds=3600):
+    global _outbox
+    _outbox = NotificationOutbox(max_attempts, base_backoff_seconds, max_backoff_seconds)
+    return _outbox
+
+def get_notification_outbox():
+    return _outbox
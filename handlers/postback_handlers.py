@@ -2,11 +2,18 @@ from urllib.parse import parse_qs
 
 from linebot.v3.messaging import TextMessage
 
-from database.task_operations import get_task, update_task
+from database.task_model import Task
+from database.task_operations import (create_task, delete_task, get_task,
+                                      update_task)
+from handlers.chat_timezones import get_chat_timezone
 from handlers.message_handlers import (build_notify_datetime_picker_message,
                                        build_task_created_message,
                                        build_task_updated_message,
-                                       reply_message)
+                                       decode_task_cursor, get_chat_id,
+                                       get_group_or_room_id, reply_message,
+                                       reply_task_list)
+from handlers.reminder_drafts import decode_reminder_draft
+from handlers.reminder_scheduler import notify_date_changed
 from utils.timer import is_earlier_than_now, to_utc_datetime
 
 
@@ -14,8 +21,9 @@ def handle_expire_date_postback(event, line_bot_configuration, app):
     """
     Handle postback event to set datetime for a task.
 
-    Parses the postback data to extract task ID and selected datetime,
-    then updates the Task document in Firestore.
+    Parses the postback data to extract the reminder draft (or task ID) and
+    selected datetime, then writes the Task document in Firestore: a draft is
+    created in a single write, an existing task is updated.
 
     :param event: PostbackEvent object
     :param line_bot_configuration: LINE bot configuration
@@ -23,14 +31,26 @@ def handle_expire_date_postback(event, line_bot_configuration, app):
     :return: 'OK' if successful
     """
     try:
-        # Parse postback data (expected format: taskId=<id>&action=expireDate)
+        # Parse postback data (expected format: draft=<token>&action=expireDate or taskId=<id>&action=expireDate)
         params = parse_qs(event.postback.data)
-        if 'taskId' not in params or 'action' not in params:
-            raise ValueError("Missing taskId or datetime in postback data")
+        if ('draft' not in params and 'taskId' not in params) or 'action' not in params:
+            raise ValueError("Missing draft, taskId or datetime in postback data")
+
+        chat_id = get_group_or_room_id(event.source)
+        draft = None
+        if 'draft' in params:
+            try:
+                draft = decode_reminder_draft(params['draft'][0])
+            except ValueError as e:
+                app.logger.info("Rejected reminder draft: %s", e)
+            if draft is None or draft.notified_id != chat_id:
+                reply_text = "這個提醒已失效，請重新建立提醒。"
+                reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
+                return 'OK'
 
-        task_id = params['taskId'][0]
         expire_date = event.postback.params['datetime']
-        utc_expire_date = to_utc_datetime(expire_date)
+        tz = get_chat_timezone(get_chat_id(event.source))
+        utc_expire_date = to_utc_datetime(expire_date, tz)
 
         # Validate that expire_date is not earlier than now
         if is_earlier_than_now(utc_expire_date):
@@ -38,17 +58,39 @@ def handle_expire_date_postback(event, line_bot_configuration, app):
             reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
             return 'OK'
 
-        # Update the task in Firestore
-        updates = {"expireDate": utc_expire_date, "notifyDate": utc_expire_date}
-        update_task(task_id, updates)
-        task = get_task(task_id)
-
-        notify_datetime_picker_message = build_notify_datetime_picker_message(event.timestamp, expire_date, task_id)
+        if draft is not None:
+            # Write the whole task once, only if no task was created from this draft yet
+            task_id = create_task(draft.message, draft.source_id, draft.notified_id, False,
+                                  utc_expire_date, notify_date=utc_expire_date, task_id=draft.task_id)
+            if task_id is not None:
+                task = Task(task_id, draft.message, draft.source_id, draft.notified_id, False,
+                            utc_expire_date, utc_expire_date)
+            else:
+                # Picking the date again only moves the dates of a task that has not been notified yet
+                task_id = draft.task_id
+                task = get_task(task_id)
+                if task is None or task.is_notified:
+                    reply_text = "這個提醒已失效，請重新建立提醒。"
+                    reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
+                    return 'OK'
+                updates = {"expireDate": utc_expire_date, "notifyDate": utc_expire_date}
+                if not update_task(task_id, updates):
+                    raise RuntimeError("Failed to update task from reminder draft")
+                task.apply(updates)
+        else:
+            # Task created before drafts were carried in postback data
+            task_id = params['taskId'][0]
+            updates = {"expireDate": utc_expire_date, "notifyDate": utc_expire_date}
+            update_task(task_id, updates)
+            task = get_task(task_id)
+        notify_date_changed(task_id, utc_expire_date)
+
+        notify_datetime_picker_message = build_notify_datetime_picker_message(event.timestamp, expire_date, task_id, tz)
         task_created_message = build_task_created_message(task)
         reply_message(line_bot_configuration, event.reply_token, [notify_datetime_picker_message, task_created_message])
 
     except Exception as e:
-        app.logger.error(f"Error handling set task datetime postback: {e}")
+        app.logger.error("Error handling set task datetime postback: %s", e)
 
     return 'OK'
 
@@ -72,7 +114,7 @@ def handle_notify_date_postback(event, line_bot_configuration, app):
 
         task_id = params['taskId'][0]
         notify_date = event.postback.params['datetime']
-        utc_notify_date = to_utc_datetime(notify_date)
+        utc_notify_date = to_utc_datetime(notify_date, get_chat_timezone(get_chat_id(event.source)))
         task = get_task(task_id)
 
         # Validate that notify_date is not earlier than now
@@ -82,7 +124,7 @@ def handle_notify_date_postback(event, line_bot_configuration, app):
             return 'OK'
 
         # Validate that notify_date is not later than expire_date
-        if utc_notify_date > task['expireDate']:
+        if utc_notify_date > task.expire_date:
             reply_text = "設定的提醒時間不能晚於到期時間，請重新選擇。"
             reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
             return 'OK'
@@ -90,12 +132,67 @@ def handle_notify_date_postback(event, line_bot_configuration, app):
         # Update the task in Firestore
         updates = {"notifyDate": utc_notify_date}
         update_task(task_id, updates)
-        task = get_task(task_id)
+        notify_date_changed(task_id, utc_notify_date)
+        task.apply(updates)
 
         task_update_message = build_task_updated_message(task)
         reply_message(line_bot_configuration, event.reply_token, [task_update_message])
 
     except Exception as e:
-        app.logger.error(f"Error handling set task notify datetime postback: {e}")
+        app.logger.error("Error handling set task notify datetime postback: %s", e)
+
+    return 'OK'
+
+def handle_list_tasks_postback(event, line_bot_configuration, app):
+    """
+    Handle the next-page button of a task list.
+
+    :param event: PostbackEvent object
+    :param line_bot_configuration: LINE bot configuration
+    :param app: Flask app instance
+    :return: 'OK' if successful
+    """
+    try:
+        # Parse postback data (expected format: action=listTasks&after=<cursor>)
+        params = parse_qs(event.postback.data)
+        after = decode_task_cursor(params['after'][0]) if 'after' in params else None
+        reply_task_list(event, after, line_bot_configuration, app)
+
+    except Exception as e:
+        app.logger.error("Error handling list tasks postback: %s", e)
+
+    return 'OK'
+
+def handle_cancel_task_postback(event, line_bot_configuration, app):
+    """
+    Handle the cancel button of a listed task by deleting it.
+
+    :param event: PostbackEvent object
+    :param line_bot_configuration: LINE bot configuration
+    :param app: Flask app instance
+    :return: 'OK' if successful
+    """
+    try:
+        # Parse postback data (expected format: taskId=<id>&action=cancel)
+        params = parse_qs(event.postback.data)
+        if 'taskId' not in params:
+            raise ValueError("Missing taskId in postback data")
+
+        task_id = params['taskId'][0]
+        task = get_task(task_id)
+
+        # Only tasks of this chat can be cancelled from it
+        if task is None or task.is_notified or task.notified_id != get_group_or_room_id(event.source):
+            reply_text = "找不到這個提醒，可能已經提醒過或被取消了。"
+        elif delete_task(task_id):
+            notify_date_changed(task_id, None)
+            reply_text = f"已取消提醒：{task.message}"
+        else:
+            reply_text = "取消提醒失敗，請稍後再試。"
+
+        reply_message(line_bot_configuration, event.reply_token, [TextMessage(text=reply_text)])
+
+    except Exception as e:
+        app.logger.error("Error handling cancel task postback: %s", e)
 
     return 'OK'
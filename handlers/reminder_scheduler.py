@@ -0,0 +1,148 @@
+"""
+In-process reminder scheduler.
+
+Upcoming notifyDates are kept in a min-heap so the scheduler thread can sleep
+until exactly the next due time instead of relying on an external cron tick
+to hit /notify_check. Firestore stays the source of truth: the heap only
+decides when to wake up, and the delivery callback re-queries the overdue,
+unnotified tasks so a stale heap entry can never notify twice.
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from database.task_operations import get_pending_notify_tasks
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    def __init__(self, deliver, horizon_minutes=60, refresh_seconds=300):
+        """
+        :param deliver: Callable invoked from the scheduler thread whenever at least one reminder is due
+        :param horizon_minutes: How far ahead to load tasks from Firestore
+        :param refresh_seconds: How often to reload the horizon, picking up tasks written by other instances
+        """
+        self._deliver = deliver
+        self._horizon = timedelta(minutes=horizon_minutes)
+        self._refresh_interval = timedelta(seconds=refresh_seconds)
+        self._heap = []
+        self._scheduled = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._next_refresh = None
+
+    def start(self):
+        """Load overdue and upcoming tasks, then start the scheduler thread."""
+        self._stopped = False
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def schedule(self, task_id, notify_date):
+        """
+        Add or move a task in the schedule.
+
+        :param task_id: Task ID (document ID)
+        :param notify_date: Timezone-aware notify datetime, or None to unschedule
+        """
+        with self._condition:
+            if notify_date is None:
+                self._scheduled.pop(task_id, None)
+                return
+            if self._scheduled.get(task_id) == notify_date:
+                # Already in the heap; refresh() reschedules every task in the horizon on each pass
+                return
+
+            self._scheduled[task_id] = notify_date
+            # Older entries for the same task stay in the heap and are skipped when popped
+            heapq.heappush(self._heap, (notify_date, task_id))
+            if self._heap[0][1] == task_id:
+                self._condition.notify()
+
+    def unschedule(self, task_id):
+        self.schedule(task_id, None)
+
+    def refresh(self):
+        """Reload every unnotified task due within the horizon, including overdue ones."""
+        now = datetime.now(timezone.utc)
+        tasks = get_pending_notify_tasks(now + self._horizon, fields=("notifyDate",))
+        for task in tasks:
+            self.schedule(task.id, task.notify_date)
+        self._compact()
+        self._next_refresh = now + self._refresh_interval
+
+    def _compact(self):
+        """Drop the heap entries of moved and unscheduled tasks once they outnumber the live ones."""
+        with self._condition:
+            if len(self._heap) > 2 * len(self._scheduled):
+                self._heap = [(notify_date, task_id) for task_id, notify_date in self._scheduled.items()]
+                heapq.heapify(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            notify_date, task_id = heapq.heappop(self._heap)
+            if self._scheduled.get(task_id) == notify_date:
+                del self._scheduled[task_id]
+                due.append(task_id)
+        return due
+
+    def _seconds_until_next_wakeup(self, now):
+        wakeup = self._next_refresh
+        if self._heap and self._heap[0][0] < wakeup:
+            wakeup = self._heap[0][0]
+        return max(0.0, (wakeup - now).total_seconds())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                now = datetime.now(timezone.utc)
+                due = self._pop_due(now)
+                if not due and now < self._next_refresh:
+                    self._condition.wait(self._seconds_until_next_wakeup(now))
+                    continue
+
+            try:
+                if due:
+                    self._deliver()
+                if datetime.now(timezone.utc) >= self._next_refresh:
+                    self.refresh()
+            except Exception as e:
+                logger.exception("Error running reminder scheduler: %s", e)
+                # Avoid a hot loop when Firestore or LINE is unavailable
+                self._next_refresh = datetime.now(timezone.utc) + self._refresh_interval
+
+
+_scheduler = None
+
+def start_reminder_scheduler(deliver, horizon_minutes=60, refresh_seconds=300):
+    """Start the process-wide scheduler. Returns the running instance."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReminderScheduler(deliver, horizon_minutes, refresh_seconds)
+        _scheduler.start()
+    return _scheduler
+
+def stop_reminder_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+
+def notify_date_changed(task_id, notify_date):
+    """Keep the scheduler in sync after a task's notifyDate changes. No-op when the scheduler is not running."""
+    if _scheduler is not None:
+        _scheduler.schedule(task_id, notify_date)
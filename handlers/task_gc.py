@@ -0,0 +1,101 @@
+"""
+Periodic garbage collection of stale tasks.
+
+Notified tasks are kept for a retention period after they expire and drafts
+the user never finished are kept for a TTL; after that they only make every
+scan of the Task collection slower. The collector removes them in batches on
+a background thread, or once per call of run_task_gc (e.g. from a cron-hit
+route).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from database.task_operations import purge_stale_tasks
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCollector:
+    def __init__(self, interval_seconds=3600, expired_retention_days=7, draft_ttl_hours=24,
+                 page_size=200, archive=False, dry_run=False):
+        """
+        :param interval_seconds: Time between collection runs
+        :param expired_retention_days: How long notified tasks are kept after their expireDate
+        :param draft_ttl_hours: How long drafts without an expireDate are kept after creation
+        :param page_size: Tasks removed per batch
+        :param archive: Move tasks to the archive instead of deleting them
+        :param dry_run: Only count stale tasks, never remove them
+        """
+        self.interval_seconds = interval_seconds
+        self.expired_retention = timedelta(days=expired_retention_days)
+        self.draft_ttl = timedelta(hours=draft_ttl_hours)
+        self.page_size = page_size
+        self.archive = archive
+        self.dry_run = dry_run
+        self.last_result = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self, dry_run=None):
+        """
+        Run one collection pass.
+
+        :param dry_run: Override the configured dry-run mode for this pass
+        :return: Counts from purge_stale_tasks, plus elapsedMs
+        """
+        now = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        result = purge_stale_tasks(
+            expired_before=now - self.expired_retention,
+            created_before=now - self.draft_ttl,
+            page_size=self.page_size,
+            archive=self.archive,
+            dry_run=self.dry_run if dry_run is None else dry_run,
+        )
+        result["elapsedMs"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_result = result
+        logger.info("Task GC run: %s", result)
+        return result
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="task-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("Error running task GC: %s", e)
+
+
+_collector = None
+
+def configure_task_gc(**options):
+    """Set the collector options. See TaskCollector for the accepted keyword arguments."""
+    global _collector
+    _collector = TaskCollector(**options)
+    return _collector
+
+def start_task_gc():
+    """Run the configured collector periodically on a background thread."""
+    if _collector is not None and _collector._thread is None:
+        _collector.start()
+
+def stop_task_gc():
+    if _collector is not None:
+        _collector.stop()
+
+def run_task_gc(dry_run=None):
+    """Run one collection pass now with the configured options."""
+    collector = _collector or configure_task_gc()
+    return collector.run_once(dry_run)
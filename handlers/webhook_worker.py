@@ -0,0 +1,131 @@
+"""
+Bounded background worker pool for webhook processing.
+
+The /callback route verifies the signature, enqueues the body and returns
+immediately; Firestore writes and LINE replies then happen on the worker
+threads, well inside LINE's webhook timeout.
+"""
+import logging
+import queue
+import threading
+import time
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolClosed(RuntimeError):
+    """Raised by submit once shutdown has started."""
+
+
+class WebhookWorkerPool:
+    def __init__(self, process, workers=4, queue_size=100):
+        """
+        :param process: Callable invoked on a worker thread with the submitted arguments
+        :param workers: Number of worker threads
+        :param queue_size: Maximum number of webhooks waiting for a worker
+        """
+        self._process = process
+        self._workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._processing_total = 0.0
+        self._processing_max = 0.0
+
+    def start(self):
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, *args):
+        """
+        Enqueue a webhook for background processing.
+
+        :return: True if queued, False if the queue is full and the caller should process it inline
+        :raises WorkerPoolClosed: If the pool is shutting down; the caller should answer with an
+                                  error status so LINE redelivers the webhook elsewhere
+        """
+        with self._lock:
+            # Checked under the lock so nothing is queued behind the stop markers
+            if self._closed:
+                self._rejected += 1
+                raise WorkerPoolClosed("Webhook worker pool is shut down")
+            try:
+                self._queue.put_nowait((time.perf_counter(), args))
+                return True
+            except queue.Full:
+                self._rejected += 1
+                return False
+
+    def shutdown(self, timeout=10):
+        """
+        Stop accepting work, let the workers drain the queue and wait for them to finish.
+
+        :param timeout: Seconds to wait in total; workers still busy after that are abandoned
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+        for _ in self._threads:
+            try:
+                self._queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                logger.warning("Webhook queue still full at shutdown, %d webhooks not processed", self._queue.qsize())
+                break
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self):
+        with self._lock:
+            done = self._processed + self._failed
+            return {
+                "queueDepth": self._queue.qsize(),
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "waitMs": {
+                    "avg": round(self._wait_total / done * 1000, 1) if done else 0.0,
+                    "max": round(self._wait_max * 1000, 1),
+                },
+                "processingMs": {
+                    "avg": round(self._processing_total / done * 1000, 1) if done else 0.0,
+                    "max": round(self._processing_max * 1000, 1),
+                },
+            }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            enqueued_at, args = item
+            started = time.perf_counter()
+            failed = False
+            try:
+                self._process(*args)
+            except Exception as e:
+                failed = True
+                logger.exception("Error processing webhook in background: %s", e)
+            finished = time.perf_counter()
+
+            with self._lock:
+                if failed:
+                    self._failed += 1
+                else:
+                    self._processed += 1
+                wait, processing = started - enqueued_at, finished - started
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._processing_total += processing
+                self._processing_max = max(self._processing_max, processing)
@@ -1,23 +1,159 @@
-from flask import Flask, abort, request
+from utils import startup  # isort: skip  (starts the cold-start clock)
+
+import atexit
+import hmac
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, Response, abort, g, jsonify, request
 from linebot.v3 import WebhookHandler
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import Configuration
 from linebot.v3.webhooks import MessageEvent, PostbackEvent, TextMessageContent
 
-from database.task_operations import get_notify_tasks, update_task
-from handlers.message_handlers import (build_notification_message,
-                                       handle_tag_bot_message, push_message)
-from handlers.postback_handlers import (handle_expire_date_postback,
+from database.firestore_init import get_db
+from database.task_operations import configure_task_cache, get_task_cache_stats
+from database.task_storage import (FIRESTORE_BACKEND, configure_task_storage,
+                                   get_task_storage)
+from handlers.chat_timezones import configure_chat_timezones
+from handlers.event_dedup import (configure_event_dedup, forget_event,
+                                  get_duplicate_count, is_duplicate_event)
+from handlers.flex_templates import load_flex_templates
+from handlers.line_client import (close_messaging_clients,
+                                  configure_messaging_client,
+                                  get_messaging_api)
+from handlers.message_handlers import (CANCEL_TASK_ACTION, LIST_TASKS_ACTION,
+                                       handle_tag_bot_message)
+from handlers.notification_dispatcher import deliver_due_tasks
+from handlers.notification_outbox import (configure_notification_outbox,
+                                          get_notification_outbox)
+from handlers.postback_handlers import (handle_cancel_task_postback,
+                                        handle_expire_date_postback,
+                                        handle_list_tasks_postback,
                                         handle_notify_date_postback)
+from handlers.reminder_drafts import configure_reminder_drafts
+from handlers.reminder_scheduler import (start_reminder_scheduler,
+                                         stop_reminder_scheduler)
+from handlers.task_gc import (configure_task_gc, run_task_gc, start_task_gc,
+                              stop_task_gc)
+from handlers.webhook_worker import WebhookWorkerPool, WorkerPoolClosed
 from utils.config import get_settings
+from utils.logging_config import Truncated, configure_logging
+from utils.metrics import REGISTRY, GaugeFunction, Histogram
+from utils.timer import configure_default_timezone, log_timezone_info
 
-app = Flask(__name__)
 settings = get_settings()
+configure_logging(
+    level=settings.log_level,
+    module_levels=settings.log_module_levels,
+    sample_rate=settings.log_sample_rate,
+    log_format=settings.log_format,
+)
 
-app.logger.setLevel(settings.log_level.upper())
+app = Flask(__name__)
+configure_default_timezone(settings.default_timezone)
+log_timezone_info()
 
-line_bot_configuration = Configuration(access_token=settings.line_channel_access_token)
+line_bot_configuration = Configuration(host=settings.line_api_host, access_token=settings.line_channel_access_token)
+configure_messaging_client(
+    line_bot_configuration,
+    pool_size=settings.line_api_pool_size,
+    connect_timeout=settings.line_api_connect_timeout,
+    read_timeout=settings.line_api_read_timeout,
+)
 handler = WebhookHandler(settings.line_channel_secret)
+load_flex_templates(hot_reload=settings.flex_template_hot_reload)
+configure_task_storage(settings.storage_backend, sqlite_path=settings.sqlite_path)
+configure_task_cache(max_size=settings.task_cache_max_size, ttl_seconds=settings.task_cache_ttl_seconds)
+configure_event_dedup(
+    backend=settings.event_dedup_backend,
+    max_size=settings.event_dedup_max_size,
+    ttl_seconds=settings.event_dedup_ttl_seconds,
+)
+configure_chat_timezones(
+    backend=settings.chat_timezone_backend,
+    ttl_seconds=settings.chat_timezone_ttl_seconds,
+    max_size=settings.chat_timezone_cache_size,
+)
+configure_notification_outbox(
+    max_attempts=settings.notify_outbox_max_attempts,
+    base_backoff_seconds=settings.notify_outbox_base_backoff_seconds,
+    max_backoff_seconds=settings.notify_outbox_max_backoff_seconds,
+)
+configure_reminder_drafts(settings.line_channel_secret, ttl_seconds=settings.reminder_draft_ttl_hours * 3600)
+configure_task_gc(
+    interval_seconds=settings.gc_interval_seconds,
+    expired_retention_days=settings.gc_expired_retention_days,
+    draft_ttl_hours=settings.gc_draft_ttl_hours,
+    page_size=settings.gc_page_size,
+    archive=settings.gc_archive,
+    dry_run=settings.gc_dry_run,
+)
+
+webhook_pool = None
+if settings.webhook_async:
+    webhook_pool = WebhookWorkerPool(handler.handle, workers=settings.webhook_workers, queue_size=settings.webhook_queue_size)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "yangbot_http_request_seconds",
+    "Time spent handling HTTP requests, by Flask endpoint",
+    ["endpoint"],
+)
+GaugeFunction("yangbot_task_cache", "Task cache size, hits and misses", get_task_cache_stats, labelname="stat")
+GaugeFunction("yangbot_duplicate_events", "Redelivered webhook events skipped", get_duplicate_count)
+GaugeFunction("yangbot_startup_milliseconds", "Milliseconds from process start to each startup stage", startup.get_startup_stats, labelname="stage")
+if webhook_pool is not None:
+    GaugeFunction(
+        "yangbot_webhook_queue",
+        "Background webhook queue depth and processed/failed/rejected counts",
+        lambda: {k: v for k, v in webhook_pool.stats().items() if not isinstance(v, dict)},
+        labelname="stat",
+    )
+    GaugeFunction(
+        "yangbot_webhook_wait_milliseconds",
+        "Average and maximum time webhooks waited in the queue",
+        lambda: webhook_pool.stats()["waitMs"],
+        labelname="stat",
+    )
+    GaugeFunction(
+        "yangbot_webhook_processing_milliseconds",
+        "Average and maximum time spent processing a queued webhook",
+        lambda: webhook_pool.stats()["processingMs"],
+        labelname="stat",
+    )
+
+def warm_up():
+    """Create the Firestore and LINE clients ahead of the first request."""
+    if settings.storage_backend == FIRESTORE_BACKEND:
+        get_db()
+    get_messaging_api(line_bot_configuration)
+    startup.mark("warmedUp")
+
+@app.before_request
+def record_first_request():
+    startup.mark("firstRequest")
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get("request_started")
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "unknown")
+    return response
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/warmup", methods=['GET'])
+def warmup():
+    """Warm-up endpoint for platforms that send a warm-up request before routing traffic."""
+    warm_up()
+    return jsonify(startup.get_startup_stats())
 
 @app.route("/callback", methods=['POST'])
 def callback():
@@ -26,61 +162,195 @@ def callback():
 
     # get request body as text
     body = request.get_data(as_text=True)
-    app.logger.info("Request body: " + body)
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug("Request body: %s", Truncated(body, settings.log_max_body_length), extra={"sampled": True})
 
     # handle webhook body
     try:
+        if webhook_pool is not None:
+            # Verify before acknowledging; the worker re-parses the body when it runs
+            if not handler.parser.signature_validator.validate(body, signature):
+                raise InvalidSignatureError('Invalid signature. signature=' + signature)
+            if webhook_pool.submit(body, signature):
+                return 'OK'
+            app.logger.warning("Webhook queue is full, handling request inline")
         handler.handle(body, signature)
     except InvalidSignatureError:
         abort(400)
+    except WorkerPoolClosed:
+        # Shutting down; a non-2xx status makes LINE redeliver the webhook
+        abort(503)
 
     return 'OK'
 
+@app.route("/webhook_stats", methods=['GET'])
+def webhook_stats():
+    """Queue depth, wait time and processing time of the background webhook workers."""
+    if webhook_pool is None:
+        return jsonify({"async": False})
+    return jsonify({"async": True, **webhook_pool.stats()})
+
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_message(event):
     # Check if the bot is mentioned
     if event.message.mention != None and event.message.mention.mentionees[0].is_self:
-        # split by empty space and trim each text
-        split_text = [text.strip() for text in event.message.text.split(' ') if text.strip() != '']
-        app.logger.info("split_text: " + str(split_text))
-        return handle_tag_bot_message(event, split_text, line_bot_configuration, app)
+        # Only mentions write anything, so only they need the (possibly remote) seen-set
+        if is_duplicate_event(event):
+            app.logger.info("Skipping redelivered event %s", event.webhook_event_id)
+            return
+
+        try:
+            # split by empty space and trim each text
+            split_text = [text.strip() for text in event.message.text.split(' ') if text.strip() != '']
+            app.logger.debug("split_text: %s", split_text)
+            return handle_tag_bot_message(event, split_text, line_bot_configuration, app)
+        except Exception:
+            # Let LINE's redelivery of this event be handled instead of skipped
+            forget_event(event)
+            raise
     else:
-        app.logger.info("Not tag bot, repeat message")
+        app.logger.debug("Not tag bot, repeat message")
 
 @handler.add(PostbackEvent)
 def handle_postback(event):
+    if is_duplicate_event(event):
+        app.logger.info("Skipping redelivered event %s", event.webhook_event_id)
+        return
+
+    try:
+        return route_postback(event)
+    except Exception:
+        # Let LINE's redelivery of this event be handled instead of skipped
+        forget_event(event)
+        raise
+
+def route_postback(event):
     postback_data: str = event.postback.data
 
-    if postback_data.startswith("taskId=") and 'expireDate' in postback_data:
+    if postback_data.startswith(("draft=", "taskId=")) and 'expireDate' in postback_data:
         return handle_expire_date_postback(event, line_bot_configuration, app)
 
     if postback_data.startswith("taskId=") and 'notifyDate' in postback_data:
         return handle_notify_date_postback(event, line_bot_configuration, app)
 
+    if postback_data.startswith("taskId=") and postback_data.endswith(f"action={CANCEL_TASK_ACTION}"):
+        return handle_cancel_task_postback(event, line_bot_configuration, app)
+
+    if postback_data.startswith(f"action={LIST_TASKS_ACTION}"):
+        return handle_list_tasks_postback(event, line_bot_configuration, app)
+
 @app.route("/notify_check", methods=['GET'])
 def notify_check():
     """Endpoint to manually trigger task notification check."""
-    tasks = get_notify_tasks()
+    now = datetime.now(timezone.utc)
+    stats = notify_tasks(now - timedelta(minutes=1), now)
 
-    if len(tasks) == 0:
+    if stats["total"] == 0 and stats["notClaimed"] == 0:
         return 'No tasks to notify.'
 
-    for task in tasks:
-        notification_message = build_notification_message(task)
-        state = push_message(
-            line_bot_configuration=line_bot_configuration,
-            to=task['notifiedId'],
-            messages=[notification_message]
-        )
-        if state == 'OK':
-            update_task(task['id'], {'isNotified': True})
+    return jsonify(stats)
 
-    return 'OK'
+@app.route("/notify_backlog", methods=['GET'])
+def notify_backlog():
+    """Endpoint reporting notifications waiting for a retry: how many, and how far behind the oldest is."""
+    return jsonify(get_notification_outbox().backlog())
+
+def get_notify_owner():
+    """
+    Lease owner name of this process. Read at call time, so a preloaded app
+    forked into gunicorn workers gets each worker's own PID, not the master's.
+    """
+    return settings.instance_id or f"{socket.gethostname()}-{os.getpid()}"
+
+def notify_tasks(start, end):
+    stats = deliver_due_tasks(
+        start,
+        end,
+        line_bot_configuration,
+        owner=get_notify_owner(),
+        lease_seconds=settings.notify_lease_seconds,
+        page_size=settings.notify_page_size,
+        shard_index=settings.notify_shard_index,
+        shard_count=settings.notify_shard_count,
+        max_concurrency=settings.notify_max_concurrency,
+        max_retries=settings.notify_max_retries,
+        base_backoff=settings.notify_backoff_seconds,
+        group=settings.notify_group_by_chat,
+    )
+    if stats["total"] or stats["notClaimed"]:
+        app.logger.info("Notification run: %s", stats)
+    return stats
+
+def notify_pending_tasks():
+    """Notify every overdue, unnotified task. Called by the reminder scheduler when a reminder is due."""
+    notify_tasks(None, datetime.now(timezone.utc))
+
+@app.route("/gc_tasks", methods=['POST'])
+def gc_tasks():
+    """
+    Endpoint to run one stale task collection pass, e.g. from a daily cron. ?dryRun=true only counts.
+    It deletes data, so the caller must send the configured gc_token in the X-GC-Token header.
+    """
+    token = request.headers.get("X-GC-Token", "")
+    if not settings.gc_token or not hmac.compare_digest(token.encode(), settings.gc_token.encode()):
+        abort(403)
+
+    dry_run = request.args.get("dryRun")
+    if dry_run is not None:
+        dry_run = dry_run.lower() in ("1", "true", "yes")
+    return jsonify(run_task_gc(dry_run))
 
 # Hello World entry point
 @app.route("/")
 def hello():
     return "Hello, World!"
 
+def start_background_services():
+    """
+    Start the threads that serve this process: webhook workers, the reminder
+    scheduler and the stale task collector, then warm up the clients if configured. Threads do not survive
+    fork, so a pre-forking server calls this in each worker (see wsgi.py).
+    """
+    if webhook_pool is not None:
+        webhook_pool.start()
+    if settings.task_watch_enabled:
+        if settings.storage_backend == FIRESTORE_BACKEND:
+            from database.firestore_task_storage import start_task_watch
+
+            # Wait briefly so the scheduler's first refresh can already use the index
+            start_task_watch(get_task_storage(), check_seconds=settings.task_watch_check_seconds, sync_timeout=10)
+        else:
+            app.logger.warning("TASK_WATCH_ENABLED only applies to the Firestore backend")
+    if settings.scheduler_enabled:
+        start_reminder_scheduler(
+            notify_pending_tasks,
+            horizon_minutes=settings.scheduler_horizon_minutes,
+            refresh_seconds=settings.scheduler_refresh_seconds,
+        )
+    if settings.gc_enabled:
+        start_task_gc()
+    if settings.warm_up_on_start:
+        warm_up()
+
+    startup.mark("ready")
+    app.logger.info("Startup timings (ms): %s", startup.get_startup_stats())
+
+def stop_background_services():
+    """Drain queued webhooks, stop the scheduler and collector and release outbound connections."""
+    if webhook_pool is not None:
+        webhook_pool.shutdown(timeout=settings.server_graceful_timeout_seconds)
+    stop_reminder_scheduler()
+    stop_task_gc()
+    if settings.task_watch_enabled and settings.storage_backend == FIRESTORE_BACKEND:
+        from database.firestore_task_storage import stop_task_watch
+
+        stop_task_watch(get_task_storage())
+    close_messaging_clients()
+
+if settings.start_services_on_import:
+    start_background_services()
+    atexit.register(stop_background_services)
+
+# Development server only; production runs `gunicorn wsgi:app` (see gunicorn.conf.py)
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=settings.port)
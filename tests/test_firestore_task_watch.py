@@ -0,0 +1,252 @@
+"""
+Tests for the snapshot-listener task index in database.firestore_task_watch.
+
+The unit tests drive TaskWatch through a fake query whose on_snapshot hands
+the callback back to the test. The emulator tests run against a real
+listener and are skipped unless FIRESTORE_EMULATOR_HOST is set, e.g.
+
+    gcloud emulators firestore start --host-port=localhost:8080
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m pytest tests
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import database.firestore_task_watch as firestore_task_watch
+from database.firestore_task_watch import TaskWatch
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeDocument:
+    def __init__(self, document_id, data):
+        self.id = document_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class BrokenDocument(FakeDocument):
+    def to_dict(self):
+        raise ValueError("undecodable document")
+
+
+class FakeListener:
+    def __init__(self, callback):
+        self.callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+
+class FakeQuery:
+    """Stands in for both the client and the query: collection().where().on_snapshot()."""
+
+    def __init__(self):
+        self.listeners = []
+
+    def collection(self, name):
+        return self
+
+    def where(self, filter=None):
+        return self
+
+    def on_snapshot(self, callback):
+        listener = FakeListener(callback)
+        self.listeners.append(listener)
+        return listener
+
+    @property
+    def listener(self):
+        return self.listeners[-1]
+
+
+def task_document(task_id, minutes, **fields):
+    return FakeDocument(task_id, {
+        "message": task_id,
+        "notifiedId": "G1",
+        "isNotified": False,
+        "notifyDate": NOW + timedelta(minutes=minutes),
+        **fields,
+    })
+
+def change(kind, doc):
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=doc)
+
+def deliver(listener, docs, changes=()):
+    listener.callback(docs, list(changes), NOW)
+
+def pending_ids(watch, end_minutes=60):
+    return [task.id for task in watch.pending_in_range(None, NOW + timedelta(minutes=end_minutes))]
+
+
+@pytest.fixture
+def fake_query(monkeypatch):
+    query = FakeQuery()
+    monkeypatch.setattr(firestore_task_watch, "get_db", lambda: query)
+    return query
+
+@pytest.fixture
+def watch(fake_query):
+    watch = TaskWatch("Task", check_seconds=3600)
+    watch.start()
+    yield watch
+    watch.stop()
+
+
+def test_not_synced_until_first_snapshot(watch, fake_query):
+    assert not watch.synced
+
+    deliver(fake_query.listener, [task_document("b", 20), task_document("a", 10)])
+
+    assert watch.synced
+    assert pending_ids(watch) == ["a", "b"]
+
+def test_applies_added_modified_and_removed_changes(watch, fake_query):
+    a, b = task_document("a", 10), task_document("b", 20)
+    deliver(fake_query.listener, [a, b])
+
+    c = task_document("c", 5)
+    b_moved = task_document("b", 90)
+    deliver(fake_query.listener, [a, b_moved, c], [change("ADDED", c), change("MODIFIED", b_moved), change("REMOVED", a)])
+
+    assert pending_ids(watch) == ["c"]
+    assert pending_ids(watch, end_minutes=120) == ["c", "b"]
+    assert len(watch) == 2
+
+def test_pending_in_range_respects_bounds(watch, fake_query):
+    deliver(fake_query.listener, [task_document("a", 10), task_document("b", 20), task_document("c", 30)])
+
+    tasks = watch.pending_in_range(NOW + timedelta(minutes=15), NOW + timedelta(minutes=30))
+
+    assert [task.id for task in tasks] == ["b", "c"]
+
+def test_returns_copies(watch, fake_query):
+    deliver(fake_query.listener, [task_document("a", 10)])
+
+    watch.pending_in_range(None, NOW + timedelta(minutes=60))[0].is_notified = True
+
+    assert pending_ids(watch) == ["a"]
+
+def test_discard_removes_ahead_of_listener(watch, fake_query):
+    deliver(fake_query.listener, [task_document("a", 10), task_document("b", 20)])
+
+    watch.discard(["a", "missing"])
+
+    assert pending_ids(watch) == ["b"]
+
+def test_resync_rebuilds_from_new_listener_and_ignores_old_one(watch, fake_query):
+    old = fake_query.listener
+    deliver(old, [task_document("a", 10)])
+
+    old.is_active = False
+    assert not watch.synced
+    watch.resync()
+    assert watch.resyncs == 1
+    assert len(fake_query.listeners) == 2
+    assert not watch.synced
+
+    # A late callback from the dropped listener must not touch the index
+    deliver(old, [task_document("stale", 1)], [change("ADDED", task_document("stale", 1))])
+    assert not watch.synced
+
+    deliver(fake_query.listener, [task_document("b", 20)])
+    assert watch.synced
+    assert pending_ids(watch) == ["b"]
+
+def test_monitor_resubscribes_dropped_listener(fake_query):
+    watch = TaskWatch("Task", check_seconds=0.05)
+    watch.start()
+    try:
+        deliver(fake_query.listener, [task_document("a", 10)])
+        fake_query.listener.is_active = False
+
+        deadline = time.monotonic() + 5
+        while len(fake_query.listeners) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert len(fake_query.listeners) == 2
+        deliver(fake_query.listener, [task_document("a", 10), task_document("b", 20)])
+        assert pending_ids(watch) == ["a", "b"]
+    finally:
+        watch.stop()
+
+def test_bad_snapshot_clears_synced_and_next_full_snapshot_recovers(watch, fake_query):
+    deliver(fake_query.listener, [task_document("a", 10)])
+
+    deliver(fake_query.listener, [], [change("MODIFIED", BrokenDocument("a", {}))])
+    assert not watch.synced
+
+    deliver(fake_query.listener, [task_document("a", 10)])
+    assert watch.synced
+    assert pending_ids(watch) == ["a"]
+
+
+requires_emulator = pytest.mark.skipif(
+    not os.environ.get("FIRESTORE_EMULATOR_HOST"), reason="FIRESTORE_EMULATOR_HOST is not set"
+)
+
+@pytest.fixture
+def emulator_collection(monkeypatch):
+    from google.cloud import firestore
+
+    client = firestore.Client(project=os.environ.get("GOOGLE_CLOUD_PROJECT", "yangbot-test"))
+    monkeypatch.setattr(firestore_task_watch, "get_db", lambda: client)
+    collection = client.collection(f"Task-{uuid.uuid4().hex[:8]}")
+    yield collection
+    for doc in collection.list_documents():
+        doc.delete()
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the task index")
+        time.sleep(0.05)
+
+def write_task(collection, task_id, minutes, is_notified=False):
+    collection.document(task_id).set({
+        "message": task_id,
+        "notifiedId": "G1",
+        "isNotified": is_notified,
+        "notifyDate": NOW + timedelta(minutes=minutes),
+    })
+
+@requires_emulator
+def test_emulator_sync_changes_and_resync(emulator_collection):
+    write_task(emulator_collection, "a", 10)
+    write_task(emulator_collection, "done", 5, is_notified=True)
+
+    watch = TaskWatch(emulator_collection.id, check_seconds=3600)
+    watch.start(timeout=10)
+    try:
+        # Initial sync only holds unnotified tasks
+        assert watch.synced
+        assert pending_ids(watch) == ["a"]
+
+        write_task(emulator_collection, "b", 20)
+        wait_for(lambda: pending_ids(watch) == ["a", "b"])
+
+        emulator_collection.document("b").update({"notifyDate": NOW + timedelta(minutes=1)})
+        wait_for(lambda: pending_ids(watch) == ["b", "a"])
+
+        # Marking a task notified drops it out of the listened query
+        emulator_collection.document("a").update({"isNotified": True})
+        wait_for(lambda: pending_ids(watch) == ["b"])
+
+        # Changes made while no listener runs are picked up by the resync's full snapshot
+        watch._unsubscribe()
+        assert not watch.synced
+        write_task(emulator_collection, "c", 30)
+        emulator_collection.document("b").delete()
+        watch.resync()
+        wait_for(lambda: watch.synced)
+        assert pending_ids(watch) == ["c"]
+    finally:
+        watch.stop()
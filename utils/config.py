@@ -5,8 +5,106 @@ class Settings(BaseSettings):
     line_channel_access_token: str
     line_channel_secret: str
     log_level: str = "INFO"
+    # Per-module overrides, e.g. "database=WARNING,handlers.webhook_worker=DEBUG"
+    log_module_levels: str = ""
+    # Fraction of sampled records (e.g. webhook bodies) to keep
+    log_sample_rate: float = 1.0
+    log_max_body_length: int = 1000
+    # "json" or "text"
+    log_format: str = "json"
     port: int = 8080
 
+    # Production server (gunicorn.conf.py); 0 workers means one per CPU core
+    server_workers: int = 0
+    server_threads: int = 8
+    server_preload_app: bool = True
+    server_timeout_seconds: int = 30
+    server_graceful_timeout_seconds: int = 30
+    server_keepalive_seconds: int = 5
+    server_max_requests: int = 0
+    # Start webhook workers and the scheduler when main is imported; wsgi.py turns this off and starts them per worker
+    start_services_on_import: bool = True
+
+    # Create Firestore and LINE clients at startup instead of on the first request
+    warm_up_on_start: bool = False
+
+    # LINE Messaging API client (host overrides https://api.line.me, e.g. for a local stand-in)
+    line_api_host: str | None = None
+    line_api_pool_size: int = 10
+    line_api_connect_timeout: float = 3.0
+    line_api_read_timeout: float = 10.0
+
+    # Process webhooks on background workers and acknowledge immediately
+    webhook_async: bool = False
+    webhook_workers: int = 4
+    webhook_queue_size: int = 100
+
+    # Webhook redelivery deduplication ("memory" or "firestore")
+    event_dedup_backend: str = "memory"
+    event_dedup_max_size: int = 10000
+    event_dedup_ttl_seconds: int = 600
+
+    # Display timezones: the default, and where per-chat choices are kept ("memory" or "firestore")
+    default_timezone: str = "Asia/Taipei"
+    chat_timezone_backend: str = "firestore"
+    chat_timezone_ttl_seconds: int = 600
+    chat_timezone_cache_size: int = 10000
+
+    # Notification fan-out
+    notify_max_concurrency: int = 8
+    notify_max_retries: int = 3
+    notify_backoff_seconds: float = 1.0
+    # Failed pushes are retried with exponential backoff, then moved to the archive as dead letters
+    notify_outbox_max_attempts: int = 8
+    notify_outbox_base_backoff_seconds: float = 60
+    notify_outbox_max_backoff_seconds: float = 3600
+    # Combine due reminders for the same chat into one push
+    notify_group_by_chat: bool = True
+    notify_page_size: int = 200
+    notify_lease_seconds: int = 300
+    # Split due-task claims and pushes across instances: each one handles shard_index of shard_count.
+    # Every instance still reads all due tasks; only the work after the read is divided
+    notify_shard_count: int = 1
+    notify_shard_index: int = 0
+    # Lease owner name; defaults to "<hostname>-<pid>"
+    instance_id: str = ""
+
+    # How long the date picker of a new reminder stays usable; the reminder is only written once a date is picked
+    reminder_draft_ttl_hours: int = 24
+
+    # Firestore only: keep unnotified tasks in memory from a snapshot listener and serve due-task scans from it
+    task_watch_enabled: bool = False
+    task_watch_check_seconds: int = 30
+
+    # In-process reminder scheduler
+    scheduler_enabled: bool = False
+    scheduler_horizon_minutes: int = 60
+    scheduler_refresh_seconds: int = 300
+
+    # Task storage backend: "firestore", "memory" or "sqlite"
+    storage_backend: str = "firestore"
+    sqlite_path: str = "yangbot.sqlite3"
+
+    # Read-through task cache
+    task_cache_max_size: int = 1024
+    task_cache_ttl_seconds: float = 300
+
+    # Stale task collection: notified tasks past expiry + retention, drafts older than the TTL
+    gc_enabled: bool = False
+    gc_interval_seconds: int = 3600
+    gc_expired_retention_days: int = 7
+    gc_draft_ttl_hours: int = 24
+    gc_page_size: int = 200
+    # Move stale tasks to the TaskArchive collection instead of deleting them
+    gc_archive: bool = False
+    # Only count stale tasks
+    gc_dry_run: bool = False
+    # Shared secret a POST /gc_tasks must send in the X-GC-Token header; the route is disabled while empty
+    gc_token: str = ""
+
+    # Reload flex templates when their JSON file changes
+    flex_template_hot_reload: bool = False
+
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
@@ -0,0 +1,132 @@
+"""
+Asynchronous, structured logging.
+
+Request threads only put records on a queue (QueueHandler); a background
+QueueListener formats them and writes to stderr, so slow stdout/stderr never
+blocks a webhook. Records are emitted as JSON lines by default, large values
+can be truncated lazily with `Truncated`, and records logged with
+`extra={"sampled": True}` are only kept for a fraction of calls.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+_listener = None
+
+
+class Truncated:
+    """Wrap a value so it is only converted and cut down to `limit` characters if the record is emitted."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.value)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}... ({len(text)} chars)"
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only `rate` of the records marked with extra={"sampled": True}; other records always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, "sampled", False) and self.rate < 1.0:
+            return random.random() < self.rate
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler formats every record on the calling thread before
+    enqueueing it; the queue here never leaves the process, so the record can
+    be passed as-is. Arguments must not be mutated after they are logged.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def parse_module_levels(spec):
+    """
+    Parse a per-module level spec such as "database=WARNING,handlers.webhook_worker=DEBUG".
+
+    :return: Dictionary of logger name -> level name
+    """
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(level="INFO", module_levels="", sample_rate=1.0, log_format="json"):
+    """
+    Route all logging through a queue to a background writer.
+
+    Call once at startup, before the Flask app logger is first used, so Flask
+    does not attach its own synchronous handler.
+
+    :param level: Root log level
+    :param module_levels: Per-module overrides, see parse_module_levels
+    :param sample_rate: Fraction of sampled records to keep
+    :param log_format: "json" for structured lines, "text" for plain text
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+    for name, module_level in parse_module_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Flush queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
@@ -0,0 +1,22 @@
+"""
+Cold-start timing.
+
+Import this module first in the entry point: the clock starts when it is
+imported, and the app records when it is ready and when the first request
+arrives.
+"""
+import time
+
+_started = time.perf_counter()
+_stages = {}
+
+
+def mark(stage):
+    """Record the time since startup for a named stage. Only the first mark of a stage is kept."""
+    _stages.setdefault(stage, time.perf_counter() - _started)
+
+def get_startup_stats():
+    """
+    :return: Dictionary of stage name -> milliseconds since startup
+    """
+    return {stage: round(seconds * 1000, 1) for stage, seconds in _stages.items()}
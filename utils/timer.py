@@ -1,30 +1,71 @@
 """
 Utility functions for handling datetime operations with timezone support.
-The unified timezone used is UTC but for any display purposes, Asia/Taipei (UTC+8) is used.
+The unified timezone used is UTC; for display, each chat can choose its own
+timezone and falls back to the default one (Asia/Taipei, UTC+8).
+
+Reminders are minute-granular, so local display strings are cached per
+(UTC minute, timezone, format): a notification burst renders the same few
+minutes over and over and only the first render pays for the conversion.
 """
 import logging
 import time
 from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE_NAME = 'Asia/Taipei'
+
+LINE_DATETIME_FORMAT = '%Y-%m-%dT%H:%M'
+DISPLAY_DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+default_timezone = ZoneInfo(DEFAULT_TIMEZONE_NAME)
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    """
+    Look up a timezone by IANA name, e.g. 'Asia/Tokyo'.
+
+    :return: ZoneInfo
+    :raises ValueError: If the name is not a known timezone
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+def configure_default_timezone(name):
+    """Set the timezone used when none is given, e.g. for chats without their own setting."""
+    global default_timezone
+    default_timezone = get_timezone(name)
 
-import pytz
+@lru_cache(maxsize=4096)
+def _format_minute(minute, tz, fmt):
+    return datetime.fromtimestamp(minute * 60, tz).strftime(fmt)
 
-default_timezone = pytz.timezone('Asia/Taipei')
+def format_local_minute(utc_datetime, tz=None, fmt=DISPLAY_DATETIME_FORMAT):
+    """
+    Format a datetime in a local timezone, truncated to the minute.
 
+    :param utc_datetime: Timezone-aware datetime
+    :param tz: Display timezone, defaults to default_timezone
+    :param fmt: strftime format without seconds or smaller fields
+    :return: Formatted string
+    """
+    return _format_minute(int(utc_datetime.timestamp()) // 60, tz or default_timezone, fmt)
 
-def get_line_datetime_string_format(timestamp, tz = default_timezone):
+def get_line_datetime_string_format(timestamp, tz=None):
     """Convert LINE timestamp (milliseconds since epoch) to formatted datetime string."""
-    return datetime.fromtimestamp(timestamp / 1000, tz).strftime('%Y-%m-%dT%H:%M')
+    return _format_minute(int(timestamp) // 60000, tz or default_timezone, LINE_DATETIME_FORMAT)
 
-def to_utc_datetime(datetime_str):
+def to_utc_datetime(datetime_str, tz=None):
     """Convert a datetime string in local timezone to UTC datetime object."""
     naive_dt = datetime.fromisoformat(datetime_str)
-    local_dt = default_timezone.localize(naive_dt)
-    utc_dt = local_dt.astimezone(pytz.UTC)
-    return utc_dt
+    return naive_dt.replace(tzinfo=tz or default_timezone).astimezone(timezone.utc)
 
-def to_local_datetime(utc_datetime, tz = default_timezone):
+def to_local_datetime(utc_datetime, tz=None):
     """Convert a UTC datetime object to local timezone datetime object."""
-    return utc_datetime.astimezone(tz)
+    return utc_datetime.astimezone(tz or default_timezone)
 
 def is_earlier_than_now(utc_datetime):
     """Check if the given UTC datetime is earlier than the current UTC time."""
@@ -34,7 +75,9 @@ def is_earlier_than_now(utc_datetime):
 def get_tzname():
     return time.tzname
 
-logging.info("Python timezone: %s", get_tzname())
-logging.info("Current datetime: %s", datetime.now())
-logging.info("UTC datetime: %s", datetime.now(pytz.UTC))
-logging.info("Asia/Taipei datetime: %s", datetime.now(default_timezone))
+def log_timezone_info():
+    """Log the process and display timezones. Called once at startup rather than on import."""
+    logging.info("Python timezone: %s", get_tzname())
+    logging.info("Current datetime: %s", datetime.now())
+    logging.info("UTC datetime: %s", datetime.now(timezone.utc))
+    logging.info("%s datetime: %s", default_timezone.key, datetime.now(default_timezone))
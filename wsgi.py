@@ -0,0 +1,44 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn wsgi:app
+
+Server options live in gunicorn.conf.py. With SERVER_PRELOAD_APP the app is
+imported once in the gunicorn master, so settings, templates and routes are
+set up before fork and shared copy-on-write by the workers. Threads, sockets
+and gRPC channels do not survive fork, so each worker drops the inherited
+clients and starts its own background services in init_worker().
+"""
+import os
+
+# Background threads must start in the workers, not in the master
+os.environ["START_SERVICES_ON_IMPORT"] = "false"
+
+import main  # isort: skip
+from database.firestore_init import reset_db
+from database.task_storage import configure_task_storage
+from handlers.line_client import close_messaging_clients
+from utils.logging_config import configure_logging, stop_logging
+
+app = main.app
+
+
+def init_worker():
+    """Re-create per-process state in a freshly forked worker, then start its background services."""
+    settings = main.settings
+    configure_logging(
+        level=settings.log_level,
+        module_levels=settings.log_module_levels,
+        sample_rate=settings.log_sample_rate,
+        log_format=settings.log_format,
+    )
+    reset_db()
+    close_messaging_clients()
+    # A SQLite connection must not be shared across processes
+    configure_task_storage(settings.storage_backend, sqlite_path=settings.sqlite_path)
+    main.start_background_services()
+
+def shutdown_worker():
+    """Finish in-flight background work before the worker exits."""
+    main.stop_background_services()
+    stop_logging()